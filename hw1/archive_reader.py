@@ -0,0 +1,167 @@
+import mmap
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from seek_index import CHUNK_SIZE, SPAN, ChunkStream, SeekIndex, detect_compression, inflate, new_decompressor
+
+
+class LruCache:
+    # LRU-кэш содержимого файлов, ограниченный суммарным размером в байтах
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        data = self.entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.used_bytes -= len(old)
+        self.entries[key] = data
+        self.used_bytes += len(data)
+        while self.used_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.used_bytes -= len(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.used_bytes = 0
+
+
+class ArchiveReader:
+    # Чтение данных члена архива по смещению и размеру, записанным при сканировании.
+    # Несжатый tar отображается в память (mmap). Для gzip строится индекс точек входа
+    # (SeekIndex), и чтение распаковывает данные только от ближайшей точки. Состояние
+    # распаковщиков bz2, xz и zstd нельзя скопировать, поэтому такие архивы один раз
+    # распаковываются во временный файл, который затем отображается в память.
+    def __init__(self, path, cache_bytes=16 * 1024 * 1024, span=SPAN):
+        self.path = path
+        self.cache = LruCache(cache_bytes)
+        self.span = span
+        self.compression = None
+        self.file = None
+        self.map = None
+        self.index = None  # Точки входа в gzip-поток
+        self.spool = None  # Распакованная копия архива bz2/xz/zstd
+        self.lock = threading.RLock()  # Чтение может идти из нескольких сессий одновременно
+
+    def open(self):
+        self.compression = detect_compression(self.path)
+        self.file = open(self.path, 'rb')
+        if self.compression is None:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        elif self.compression == "gz":
+            self.index = SeekIndex(self.compression, self.span)
+
+    def is_open(self):
+        return self.file is not None
+
+    @contextmanager
+    def scan(self):
+        # Файловый объект для первого прохода tarfile по архиву (режим 'r:' для несжатого,
+        # 'r|' для сжатого). Попутно строится индекс точек входа или распакованная копия,
+        # так что последующие чтения не распаковывают архив с начала.
+        with self.lock:
+            if not self.is_open():
+                self.open()
+            if self.compression is None:
+                with open(self.path, 'rb') as file:
+                    yield file
+                return
+            with open(self.path, 'rb') as file:
+                if self.index is not None:
+                    stream = ChunkStream(data for _, data in self.index.iter_from(file, 0))
+                else:
+                    stream = ChunkStream(self.iter_spool(file))
+                try:
+                    yield stream
+                    stream.drain()
+                except BaseException:
+                    self.close_locked()
+                    raise
+
+    def iter_spool(self, file):
+        spool = tempfile.TemporaryFile()
+        try:
+            for _, _, data in inflate(file, self.compression, new_decompressor(self.compression)):
+                spool.write(data)
+                yield data
+        except BaseException:
+            spool.close()
+            raise
+        spool.flush()
+        self.spool = spool
+        if spool.tell():
+            self.map = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, offset, size):
+        with self.lock:
+            data = self.cache.get(offset)
+            if data is not None:
+                return data
+            data = self.read_locked(offset, size)
+            self.cache.put(offset, data)
+            return data
+
+    def read_locked(self, offset, size):
+        if not self.is_open():
+            self.open()
+        if self.index is not None:
+            return self.index.read(self.file, offset, size)
+        if self.map is None and self.compression is not None:
+            ChunkStream(self.iter_spool(self.file)).drain()
+        return self.map[offset:offset + size] if self.map is not None else b""
+
+    def iter_read(self, offset, size, chunk_size=CHUNK_SIZE):
+        # Данные члена архива кусками, без загрузки целиком и мимо LRU-кэша (grep, cat)
+        with self.lock:
+            if not self.is_open():
+                self.open()
+            index = self.index
+        end = offset + size
+        if index is not None:
+            # Свой дескриптор: распаковка от точки входа не мешает чтениям других сессий
+            with open(self.path, 'rb') as file:
+                for start, data in index.iter_from(file, offset):
+                    if start + len(data) > offset:
+                        yield data[max(0, offset - start):end - start]
+                    if start + len(data) >= end:
+                        return
+            return
+        for position in range(offset, end, chunk_size):
+            with self.lock:
+                data = self.read_locked(position, min(chunk_size, end - position))
+            yield data
+
+    def close(self):
+        # Вызывается перед перезаписью архива: смещения, индекс и кэш становятся недействительными
+        with self.lock:
+            self.close_locked()
+
+    def close_locked(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+        self.index = None
+        self.compression = None
+        self.cache.clear()
@@ -0,0 +1,114 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import tarfile
+import tempfile
+import time
+
+from archive_reader import ArchiveReader
+from seek_index import SPAN, new_compressor
+
+COMPRESSIONS = ("none", "gz", "bz2", "xz", "zst")
+
+
+def generate_archive(path, compression, files, file_size, seed=0):
+    # Архив из files файлов по file_size байт текстоподобных данных (сжимаются примерно как исходники)
+    rng = random.Random(seed)
+    words = [bytes(rng.choices(b"abcdefghijklmnopqrstuvwxyz", k=rng.randrange(2, 10))) for _ in range(512)]
+    with open(path, "wb") as raw:
+        target = raw if compression == "none" else new_compressor(raw, compression)
+        with tarfile.open(fileobj=target, mode="w|") as tar:
+            for index in range(files):
+                data = bytearray()
+                while len(data) < file_size:
+                    data += rng.choice(words) + b" "
+                info = tarfile.TarInfo(f"dir{index % 16}/file{index}.txt")
+                info.size = file_size
+                tar.addfile(info, io.BytesIO(bytes(data[:file_size])))
+        if target is not raw:
+            target.close()
+
+
+def first_scan(path, span):
+    # Первый проход по архиву: список (смещение, размер) файлов и читатель с построенным индексом
+    reader = ArchiveReader(path, cache_bytes=0, span=span)
+    with reader.scan() as source, tarfile.open(fileobj=source, mode="r|" if reader.compression else "r:") as tar:
+        members = [(member.offset_data, member.size) for member in tar if member.isfile()]
+    return reader, members
+
+
+def run_benchmark(compression, files=2000, file_size=16 * 1024, reads=200, span=SPAN, seed=0):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "archive.tar")
+        generate_archive(path, compression, files, file_size, seed)
+        total = files * file_size
+
+        started = time.perf_counter()
+        reader, members = first_scan(path, span)
+        scan_seconds = time.perf_counter() - started
+
+        rng = random.Random(seed)
+        sample = [rng.choice(members) for _ in range(reads)]
+        started = time.perf_counter()
+        for offset, size in sample:
+            reader.read(offset, size)
+        read_seconds = time.perf_counter() - started
+        checkpoints = len(reader.index.positions) if reader.index is not None else None
+        reader.close()
+
+        # Для сравнения: без индекса чтение файла распаковывает архив с начала (tarfile не читает zstd)
+        naive_ms = None
+        if compression != "zst":
+            naive_reads = max(1, reads // 20)
+            started = time.perf_counter()
+            for offset, size in sample[:naive_reads]:
+                with tarfile.open(path, "r") as tar:
+                    tar.fileobj.seek(offset)
+                    tar.fileobj.read(size)
+            naive_ms = (time.perf_counter() - started) / naive_reads * 1e3
+
+        return {
+            "compression": compression,
+            "archive_bytes": os.path.getsize(path),
+            "data_bytes": total,
+            "files": files,
+            "file_size": file_size,
+            "span": span,
+            "checkpoints": checkpoints,
+            "scan_seconds": scan_seconds,
+            "scan_mb_per_second": total / scan_seconds / 1e6,
+            "reads": reads,
+            "read_ms": read_seconds / reads * 1e3,
+            "read_mb_per_second": reads * file_size / read_seconds / 1e6,
+            "naive_read_ms": naive_ms,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк чтения сжатых архивов эмулятора.")
+    parser.add_argument("-c", "--compression", action="append", choices=COMPRESSIONS,
+                        help="Формат архива (можно указать несколько раз, по умолчанию none, gz, bz2, xz)")
+    parser.add_argument("--files", type=int, default=2000, help="Количество файлов в архиве")
+    parser.add_argument("--file-size", type=int, default=16 * 1024, help="Размер файла в байтах")
+    parser.add_argument("--reads", type=int, default=200, help="Количество чтений случайных файлов")
+    parser.add_argument("--span", type=int, default=SPAN, help="Распакованных байт между точками входа gzip")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора архива")
+    parser.add_argument("-o", "--output", help="Путь к JSON-файлу с результатами")
+
+    args = parser.parse_args()
+    reports = [run_benchmark(compression, args.files, args.file_size, args.reads, args.span, args.seed)
+               for compression in args.compression or ("none", "gz", "bz2", "xz")]
+
+    for report in reports:
+        naive = report["naive_read_ms"]
+        print(f"{report['compression']}: сканирование {report['scan_seconds']:.3f} с "
+              f"({report['scan_mb_per_second']:.1f} МБ/с), чтение файла {report['read_ms']:.3f} мс "
+              f"({report['read_mb_per_second']:.1f} МБ/с)"
+              + (f", без индекса {naive:.1f} мс" if naive is not None else ""))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "results": reports}, file, indent=2)
@@ -0,0 +1,67 @@
+import csv
+import json
+import queue
+import threading
+from collections import namedtuple
+
+LogEntry = namedtuple("LogEntry", ["timestamp", "command", "cwd", "duration", "status"])
+
+
+class CommandLogWriter:
+    # Фоновая запись журнала команд в файл JSON Lines (.jsonl) или CSV (.csv).
+    # Очередь ограничена: при переполнении записи отбрасываются и учитываются в dropped.
+    def __init__(self, path, log_format=None, flush_interval=1.0, max_queue=10000):
+        if log_format is None:
+            log_format = "csv" if path.endswith(".csv") else "jsonl"
+        if log_format not in ("jsonl", "csv"):
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.path = path
+        self.log_format = log_format
+        self.flush_interval = flush_interval
+        self.entries = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, entry):
+        try:
+            self.entries.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def format(self, entry):
+        return [entry.timestamp.isoformat(), entry.command, entry.cwd, f"{entry.duration:.6f}", entry.status]
+
+    def run(self):
+        writer = csv.writer(self.file) if self.log_format == "csv" else None
+        if writer is not None and self.file.tell() == 0:
+            writer.writerow(LogEntry._fields)
+        stopping = False
+        while not stopping:
+            # Ждем первую запись не дольше flush_interval, затем забираем все накопившиеся
+            batch = []
+            try:
+                batch.append(self.entries.get(timeout=self.flush_interval))
+                while True:
+                    batch.append(self.entries.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                stopping = True
+                batch = [entry for entry in batch if entry is not None]
+            if batch:
+                if writer is not None:
+                    writer.writerows(self.format(entry) for entry in batch)
+                else:
+                    self.file.writelines(
+                        json.dumps(dict(zip(LogEntry._fields, self.format(entry))), ensure_ascii=False) + "\n"
+                        for entry in batch
+                    )
+                self.file.flush()
+        self.file.close()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.entries.put(None)
+            self.thread.join()
@@ -0,0 +1,88 @@
+import os
+import struct
+import tempfile
+import zlib
+
+# Двоичный индекс архива рядом с ним (<архив>.idx):
+#   заголовок: магия, версия, размер и mtime архива, CRC32 начала и конца архива,
+#              количество записей, CRC32 блока записей;
+#   записи: тип (0 - каталог, 1 - файл), размер, смещение данных, длина пути, путь в UTF-8.
+INDEX_MAGIC = b"VFSIDX"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<6sHQQIIII")
+ENTRY = struct.Struct("<BQQH")
+SAMPLE_SIZE = 64 * 1024
+
+
+def index_path(archive):
+    return archive + ".idx"
+
+
+def archive_signature(archive):
+    # Размер, mtime и CRC32 первых и последних 64 КБ архива
+    stat = os.stat(archive)
+    with open(archive, "rb") as file:
+        head = zlib.crc32(file.read(SAMPLE_SIZE))
+        file.seek(max(0, stat.st_size - SAMPLE_SIZE))
+        tail = zlib.crc32(file.read(SAMPLE_SIZE))
+    return stat.st_size, stat.st_mtime_ns, head, tail
+
+
+def write_index(archive, entries):
+    # entries - список (путь, каталог ли, размер, смещение данных); запись атомарная
+    blob = bytearray()
+    for path, is_dir, size, offset in entries:
+        encoded = path.encode("utf-8")
+        blob += ENTRY.pack(0 if is_dir else 1, size, offset or 0, len(encoded))
+        blob += encoded
+    size, mtime, head, tail = archive_signature(archive)
+    header = HEADER.pack(INDEX_MAGIC, INDEX_VERSION, size, mtime, head, tail, len(entries), zlib.crc32(blob))
+
+    target = index_path(archive)
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target)), prefix=".tmp-")
+    except OSError:
+        return False  # Каталог недоступен для записи - работаем без индекса
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(header)
+            file.write(blob)
+        os.replace(temp_path, target)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    return True
+
+
+def read_index(archive):
+    # Список записей или None, если индекса нет, он поврежден или не соответствует архиву
+    try:
+        with open(index_path(archive), "rb") as file:
+            data = file.read()
+        signature = archive_signature(archive)
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, size, mtime, head, tail, count, checksum = HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION or (size, mtime, head, tail) != signature:
+        return None
+    blob = memoryview(data)[HEADER.size:]
+    if zlib.crc32(blob) != checksum:
+        return None
+
+    entries = []
+    position = 0
+    try:
+        for _ in range(count):
+            kind, entry_size, offset, length = ENTRY.unpack_from(blob, position)
+            position += ENTRY.size
+            path = bytes(blob[position:position + length]).decode("utf-8")
+            position += length
+            entries.append((path, kind == 0, entry_size, offset))
+    except (struct.error, UnicodeDecodeError):
+        return None
+    if position != len(blob):
+        return None
+    return entries
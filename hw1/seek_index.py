@@ -0,0 +1,152 @@
+import bisect
+import bz2
+import gzip
+import io
+import lzma
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd-архивы поддерживаются только при установленном пакете zstandard
+    zstandard = None
+
+# Сигнатуры сжатых потоков в начале файла
+MAGIC = (
+    (b"\x1f\x8b", "gz"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zst"),
+)
+CHUNK_SIZE = 64 * 1024  # Сколько сжатых байт подается распаковщику за раз
+SPAN = 1024 * 1024  # Распакованных байт между соседними точками входа
+
+
+def detect_compression(path):
+    # "gz", "bz2", "xz", "zst" или None для несжатого архива
+    with open(path, "rb") as file:
+        head = file.read(6)
+    for magic, compression in MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def new_decompressor(compression):
+    if compression == "gz":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == "bz2":
+        return bz2.BZ2Decompressor()
+    if compression == "xz":
+        return lzma.LZMADecompressor()
+    if zstandard is None:
+        raise ImportError("Для архивов zstd нужен пакет zstandard")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def new_compressor(fileobj, compression):
+    # Файловый объект, сжимающий записанное тем же форматом; fileobj он не закрывает
+    if compression == "gz":
+        return gzip.GzipFile(fileobj=fileobj, mode="wb")
+    if compression == "bz2":
+        return bz2.BZ2File(fileobj, "wb")
+    if compression == "xz":
+        return lzma.LZMAFile(fileobj, "wb")
+    if zstandard is None:
+        raise ImportError("Для архивов zstd нужен пакет zstandard")
+    return zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False)
+
+
+def inflate(file, compression, decompressor, chunk_size=CHUNK_SIZE):
+    # Генератор (позиция в сжатом файле, распаковщик, распакованный кусок) от текущей
+    # позиции file; состояние распаковщика соответствует позиции после куска.
+    # Несколько подряд записанных потоков (gzip -c >>, pbzip2) распаковываются один за другим.
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        if decompressor.eof:
+            decompressor = new_decompressor(compression)
+        data = decompressor.decompress(chunk)
+        while decompressor.eof and decompressor.unused_data:
+            rest = decompressor.unused_data
+            decompressor = new_decompressor(compression)
+            data += decompressor.decompress(rest)
+        yield file.tell(), decompressor, data
+
+
+class ChunkStream(io.RawIOBase):
+    # Файловый объект только для последовательного чтения поверх генератора кусков байт
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def drain(self):
+        # Дочитывает поток до конца, чтобы индекс покрыл весь архив
+        for _ in self.chunks:
+            pass
+
+
+def open_decompressed(path, compression):
+    # Поток распакованных данных архива с начала, без построения индекса
+    file = open(path, "rb")
+
+    def chunks():
+        with file:
+            for _, _, data in inflate(file, compression, new_decompressor(compression)):
+                yield data
+
+    return ChunkStream(chunks())
+
+
+class SeekIndex:
+    # Точки входа в сжатый gzip-поток: (позиция в распакованных данных, позиция в сжатом
+    # файле, копия распаковщика в этой точке). Чтение с произвольного смещения распаковывает
+    # данные только от ближайшей предшествующей точки. Точки добавляются при первом проходе
+    # (сканировании архива) и при чтениях за пределами уже проиндексированной части.
+    def __init__(self, compression, span=SPAN):
+        self.compression = compression
+        self.span = span
+        self.chunk_size = max(4096, min(CHUNK_SIZE, span // 16))  # Сжатые куски меньше шага между точками
+        self.positions = [0]
+        self.checkpoints = [(0, new_decompressor(compression))]
+        self.lock = threading.Lock()
+
+    def iter_from(self, file, offset):
+        # Генератор (смещение куска в распакованных данных, кусок) начиная с точки не дальше offset
+        index = bisect.bisect_right(self.positions, offset) - 1
+        position = self.positions[index]
+        compressed, decompressor = self.checkpoints[index]
+        file.seek(compressed)
+        for compressed, decompressor, data in inflate(file, self.compression, decompressor.copy(), self.chunk_size):
+            yield position, data
+            position += len(data)
+            if position - self.positions[-1] >= self.span:
+                with self.lock:  # Индекс могут дополнять несколько потоков чтения
+                    if position - self.positions[-1] >= self.span:
+                        self.checkpoints.append((compressed, decompressor.copy()))
+                        self.positions.append(position)
+
+    def read(self, file, offset, size):
+        data = bytearray()
+        end = offset + size
+        for start, chunk in self.iter_from(file, offset):
+            if start + len(chunk) > offset:
+                data += chunk[max(0, offset - start):end - start]
+            if start + len(chunk) >= end:
+                break
+        return bytes(data)
@@ -1,113 +1,477 @@
 import argparse
+import copy
+import fnmatch
+import re
+from collections import deque
 import os
 import shutil
 import tarfile
+import tempfile
 import datetime
-import tkinter as tk
+import io
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tkinter as tk
+except ImportError:  # В пакетном режиме GUI не нужен
+    tk = None
+
+from archive_reader import ArchiveReader
+from command_log import CommandLogWriter, LogEntry
+from fs_index import read_index, write_index
+from seek_index import detect_compression, new_compressor, open_decompressed
+
+
+def normalize_path(name):
+    # Имя члена архива без "./" в начале и "/" в конце
+    parts = [part for part in name.replace("\\", "/").split("/") if part and part != "."]
+    return "/".join(parts)
+
+
+def add_size(node, delta):
+    # Изменение размера файла отражается во всех каталогах-предках
+    while node is not None:
+        node.size += delta
+        node = node.parent
+
+
+class CommandCancelled(Exception):
+    pass
+
+
+class CommandError(Exception):
+    # Ошибка выполнения команды; текст ошибки выводится пользователю
+    pass
+
+
+class FsNode:
+    # Узел виртуальной файловой системы (аналог inode). У каталога есть словарь детей по имени,
+    # у файла - размер и смещение данных в архиве (content заполняется только при eager-загрузке);
+    # поиск по пути идет по цепочке детей за O(глубины). Размер каталога - суммарный размер
+    # файлов поддерева; он поддерживается при add_node и rm, поэтому du не обходит дерево.
+    __slots__ = ("name", "parent", "children", "content", "size", "offset")
+
+    def __init__(self, name, parent=None, is_dir=False, content=None, size=0, offset=None):
+        self.name = name
+        self.parent = parent
+        self.children = {} if is_dir else None
+        self.content = content
+        self.size = size
+        self.offset = offset
+
+    @property
+    def is_dir(self):
+        return self.children is not None
+
+    @property
+    def path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return "/".join(reversed(names))
 
 
 class ShellEmulator:
-    def __init__(self, file):
+    def __init__(self, file, lazy=True, cache_bytes=16 * 1024 * 1024, overlay_limit=64, use_index=True,
+                 log_size=1000, log_file=None):
         self.username = "invertie"
         self.fs_archive = file
-        self.fs_structure = {}  # Хранит файлы и каталоги виртуальной файловой системы
+        self.lazy = lazy  # Содержимое файлов читается из архива только по запросу
+        self.reader = ArchiveReader(file, cache_bytes)
+        self.whiteouts = set()  # Удаленные, но еще не вычищенные из архива пути
+        self.overlay_limit = overlay_limit
+        self.use_index = use_index  # Сохранять и переиспользовать индекс архива (<архив>.idx)
+        self.fs_structure = FsNode("", is_dir=True)  # Корень дерева виртуальной файловой системы
         self.current_directory = ""  # Текущая директория внутри виртуальной файловой системы
-        self.log_actions = []
+        self.log_actions = deque(maxlen=log_size)  # Последние log_size команд
+        self.log_writer = CommandLogWriter(log_file) if log_file else None
+        self.cancel_event = threading.Event()  # Запрос на отмену выполняемой команды
+        self.lock = threading.RLock()  # Общая для сессий блокировка изменений дерева и архива
         self.load_virtual_fs()  # Загружаем виртуальную файловую систему при инициализации
 
+    def session(self):
+        # Новая сессия над той же загруженной файловой системой: дерево, архив и отложенные
+        # удаления общие, текущая директория, лог и отмена - свои
+        session = copy.copy(self)
+        session.current_directory = ""
+        session.log_actions = deque(maxlen=self.log_actions.maxlen)
+        session.cancel_event = threading.Event()
+        return session
+
     def load_virtual_fs(self):
         if not os.path.exists(self.fs_archive):
             print(f"Archive {self.fs_archive} not found.")
             exit(1)
 
-        # Загружаем файловую систему в память, используя tarfile
-        with tarfile.open(self.fs_archive, 'r') as tar:
+        self.fs_structure = FsNode("", is_dir=True)
+        self.reader.close()
+
+        # Если индекс соответствует архиву, дерево строится из него без чтения архива
+        if self.use_index and self.lazy:
+            entries = read_index(self.fs_archive)
+            if entries is not None:
+                for path, is_dir, size, offset in entries:
+                    self.add_node(path, is_dir=is_dir, size=size, offset=None if is_dir else offset)
+                return
+
+        # Дерево строится за один проход по членам архива; в ленивом режиме
+        # запоминаются только размер и смещение данных каждого файла
+        # Сжатый архив читается последовательно; попутно строится индекс точек входа
+        entries = []
+        with self.reader.scan() as source, \
+                tarfile.open(fileobj=source, mode='r|' if self.reader.compression else 'r:') as tar:
             for member in tar:
                 if member.isdir():
-                    self.fs_structure[member.name] = set()
+                    self.add_node(member.name, is_dir=True)
+                    entries.append((normalize_path(member.name), True, 0, 0))
                 elif member.isfile():
-                    file_content = tar.extractfile(member).read().decode()
-                    self.fs_structure[member.name] = file_content
+                    file_content = None if self.lazy else tar.extractfile(member).read()
+                    self.add_node(member.name, content=file_content, size=member.size, offset=member.offset_data)
+                    entries.append((normalize_path(member.name), False, member.size, member.offset_data))
+        if self.use_index:
+            write_index(self.fs_archive, entries)
 
-        self.fs_structure[''] = set()
-        for member in self.fs_structure:
-            if member == '':
-                continue
+    def read_file(self, node):
+        # Содержимое файла в байтах: из памяти (eager) или из архива через LRU-кэш
+        if node.content is not None:
+            return node.content
+        return self.reader.read(node.offset, node.size)
+
+    def iter_lines(self, node):
+        # Строки файла в байтах без перевода строки; файл читается кусками, а не целиком
+        if node.content is not None:
+            chunks = (node.content,)
+        else:
+            chunks = self.reader.iter_read(node.offset, node.size)
+        tail = b""
+        for chunk in chunks:
+            self.check_cancelled()
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            yield from lines
+        if tail:
+            yield tail
 
-            if member.count('/') == 0:
-                self.fs_structure[''].add(member)
+    def add_node(self, name, is_dir=False, content=None, size=0, offset=None):
+        # Добавляет узел по пути архива, создавая недостающие промежуточные каталоги
+        parts = normalize_path(name).split("/")
+        if parts == [""]:
+            return self.fs_structure
+        node = self.fs_structure
+        for part in parts[:-1]:
+            child = node.children.get(part)
+            if child is None or not child.is_dir:
+                if child is not None:
+                    add_size(node, -child.size)
+                child = FsNode(part, node, is_dir=True)
+                node.children[part] = child
+            node = child
+        existing = node.children.get(parts[-1])
+        if is_dir and existing is not None and existing.is_dir:
+            return existing
+        if existing is not None:
+            add_size(node, -existing.size)  # Повторный член архива заменяет прежний
+        child = FsNode(parts[-1], node, is_dir=is_dir, content=content, size=0 if is_dir else size, offset=offset)
+        node.children[parts[-1]] = child
+        add_size(node, child.size)
+        return child
 
-            if type(self.fs_structure[member]) != set:
+    def resolve(self, path):
+        # Узел по пути относительно текущей директории (или от корня, если путь начинается с "/")
+        node = self.fs_structure if path.startswith("/") else self.resolve_absolute(self.current_directory)
+        for part in path.replace("\\", "/").split("/"):
+            if node is None:
+                return None
+            if not part or part == ".":
                 continue
+            if part == "..":
+                node = node.parent or node
+            elif node.is_dir:
+                node = node.children.get(part)
+            else:
+                return None
+        return node
 
-            for smember in self.fs_structure:
-                if smember.startswith(member) and member.count('/') + 1 == smember.count('/'):
-                    self.fs_structure[member].add(os.path.basename(smember))
+    def resolve_absolute(self, path):
+        node = self.fs_structure
+        for part in path.split("/"):
+            if not part:
+                continue
+            if node is None or not node.is_dir:
+                return None
+            node = node.children.get(part)
+        return node
 
-    def log_action(self, action):
-        self.log_actions.append((datetime.datetime.now(), action))
+    def log_action(self, action, cwd="", duration=0.0, status="ok"):
+        entry = LogEntry(datetime.datetime.now(), action, cwd, duration, status)
+        self.log_actions.append(entry)
+        if self.log_writer is not None:
+            self.log_writer.write(entry)
+
+    def close(self):
+        # Запись отложенных изменений и остатка журнала при завершении работы
+        self.sync()
+        if self.log_writer is not None:
+            self.log_writer.close()
+        self.reader.close()
 
     def execute_command(self, command):
+        return "\n".join(self.iter_command(command))
+
+    def iter_command(self, command):
+        # Выполняет команду и отдает вывод по частям, чтобы большой вывод
+        # можно было показывать постепенно, не собирая его целиком
         parts = command.split()
         if not parts:
-            return "Unknown command"
+            yield "Unknown command"
+            return
 
-        cmd = parts[0]
-        self.log_action(command)  # Логируем команду
+        # Логируем команду с текущей директорией, длительностью и результатом
+        cwd = self.current_directory
+        started = time.perf_counter()
+        status = "error"
+        try:
+            yield from self.dispatch(parts)
+            status = "ok"
+        except CommandError as e:
+            yield str(e)
+        except (CommandCancelled, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            self.log_action(command, cwd, time.perf_counter() - started, status)
 
+    def dispatch(self, parts):
+        cmd = parts[0]
         if cmd == "ls":
-            return self.cmd_ls()
+            yield from self.iter_ls()
         elif cmd == "cd":
-            return self.cmd_cd(parts[1] if len(parts) > 1 else "")
+            yield self.cmd_cd(parts[1] if len(parts) > 1 else "")
         elif cmd == "exit":
-            return "Exiting..."
+            self.sync()
+            yield "Exiting..."
+        elif cmd == "sync":
+            yield self.sync()
         elif cmd == "rm":
-            return self.cmd_rm(parts[1] if len(parts) > 1 else "")
+            yield self.cmd_rm(parts[1] if len(parts) > 1 else "")
         elif cmd == "clear":
-            return self.cmd_clear()
+            yield self.cmd_clear()
         elif cmd == "whoami":
-            return self.cmd_whoami()
+            yield self.cmd_whoami()
+        elif cmd == "find":
+            yield from self.iter_find(parts[1:])
+        elif cmd == "du":
+            yield from self.iter_du(parts[1] if len(parts) > 1 else "")
+        elif cmd == "cat":
+            yield from self.iter_cat(parts[1:])
+        elif cmd == "grep":
+            yield from self.iter_grep(parts[1:])
         else:
-            return "Unknown command"
+            raise CommandError("Unknown command")
 
-    def cmd_ls(self):
-        path = self.current_directory if self.current_directory in self.fs_structure else ""
-        if path in self.fs_structure:
-            if type(self.fs_structure[path]) == set:
-                return "\n".join(self.fs_structure[path])
-            else:
-                return "Not a directory"
-        else:
-            return "Directory not found"
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise CommandCancelled()
 
-    def cmd_cd(self, path):
-        if path == "..":
-            new_path = os.path.dirname(self.current_directory)
+    def list_children(self, node):
+        # Снимок детей каталога в порядке имен: rm из другой сессии не меняет словарь во время обхода
+        with self.lock:
+            return sorted(node.children.items())
+
+    def iter_ls(self):
+        node = self.resolve_absolute(self.current_directory) or self.fs_structure
+        if node.is_dir:
+            yield from (name for name, _ in self.list_children(node))
         else:
-            new_path = os.path.join(self.current_directory, path)
+            raise CommandError("Not a directory")
+
+    def cmd_ls(self):
+        return "\n".join(self.iter_ls())
 
-        if new_path in self.fs_structure and type(self.fs_structure[new_path]) == set:
-            self.current_directory = new_path
+    def cmd_cd(self, path):
+        node = self.resolve(path) if path else self.fs_structure
+        if node is not None and node.is_dir:
+            self.current_directory = node.path
             return f"Changed directory to {self.current_directory}"
         else:
-            return f"Directory {path} not found"
+            raise CommandError(f"Directory {path} not found")
 
     def cmd_rm(self, filename):
-        file_path = os.path.join(self.current_directory, filename).replace("\\", "/")
-        if file_path in self.fs_structure:
-            with tarfile.open(self.fs_archive, 'r') as tar:
-                with tarfile.open("temp_" + self.fs_archive, 'w') as tar_out:
+        node = self.resolve(filename) if filename else None
+        if node is None or node.parent is None:
+            raise CommandError(f"File {filename} not found")
+
+        # Удаление сразу видно в дереве, а в архиве только отмечается (whiteout);
+        # архив переписывается при sync/exit или при переполнении слоя изменений
+        with self.lock:
+            if node.parent is None or node.parent.children.get(node.name) is not node:
+                raise CommandError(f"File {filename} not found")  # Уже удален другой сессией
+            file_path = node.path
+            del node.parent.children[node.name]
+            add_size(node.parent, -node.size)
+            self.whiteouts.add(file_path)
+            if self.current_directory == file_path or self.current_directory.startswith(file_path + "/"):
+                self.current_directory = node.parent.path
+            if len(self.whiteouts) >= self.overlay_limit:
+                self.sync()
+        return f"File {filename} removed"
+
+    def iter_find(self, args):
+        # find [путь] [-name шаблон] [-type f|d]: обход дерева в памяти, архив не читается
+        path, pattern, kind = "", None, None
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg in ("-name", "-type"):
+                if not args:
+                    raise CommandError(f"find: missing argument to {arg}")
+                if arg == "-name":
+                    pattern = args.pop(0)
+                else:
+                    kind = args.pop(0)
+            else:
+                path = arg
+        start = self.resolve(path) if path else self.resolve_absolute(self.current_directory)
+        if start is None:
+            raise CommandError(f"find: {path}: No such file or directory")
+
+        for node, shown in self.walk(start, path or "."):
+            if (pattern is None or fnmatch.fnmatchcase(node.name or "/", pattern)) and \
+                    (kind is None or kind == ("d" if node.is_dir else "f")):
+                yield shown
+
+    def walk(self, start, shown):
+        # Обход поддерева в глубину в порядке имен: пары (узел, путь для вывода)
+        stack = [(start, shown)]
+        while stack:
+            self.check_cancelled()
+            node, shown = stack.pop()
+            yield node, shown
+            if node.is_dir:
+                prefix = shown.rstrip("/") + "/"
+                for name, child in reversed(self.list_children(node)):
+                    stack.append((child, prefix + name))
+
+    def iter_du(self, path):
+        # Размеры детей каталога и итог по агрегатам в узлах - O(числа детей)
+        node = self.resolve(path) if path else self.resolve_absolute(self.current_directory)
+        if node is None:
+            raise CommandError(f"du: {path}: No such file or directory")
+        shown = path or "."
+        if node.is_dir:
+            prefix = shown.rstrip("/") + "/"
+            for name, child in self.list_children(node):
+                yield f"{child.size}\t{prefix}{name}"
+        yield f"{node.size}\t{shown}"
+
+    def iter_cat(self, paths):
+        if not paths:
+            raise CommandError("cat: missing file operand")
+        for path in paths:
+            node = self.resolve(path)
+            if node is None:
+                raise CommandError(f"cat: {path}: No such file or directory")
+            if node.is_dir:
+                raise CommandError(f"cat: {path}: Is a directory")
+            for line in self.iter_lines(node):
+                yield line.decode("utf-8", errors="replace")
+
+    def iter_grep(self, args):
+        # grep [-i] шаблон [путь...]: регулярное выражение по строкам файлов, каталоги обходятся рекурсивно
+        flags = 0
+        if args and args[0] == "-i":
+            flags, args = re.IGNORECASE, args[1:]
+        if not args:
+            raise CommandError("grep: missing pattern")
+        try:
+            pattern = re.compile(args[0].encode("utf-8"), flags)
+        except re.error as e:
+            raise CommandError(f"grep: invalid pattern: {e}")
+
+        targets = []
+        for path in args[1:] or [""]:
+            node = self.resolve(path) if path else self.resolve_absolute(self.current_directory)
+            if node is None:
+                raise CommandError(f"grep: {path}: No such file or directory")
+            targets.append((node, path))
+        for node, path in targets:
+            for file_node, shown in self.walk(node, path or "."):
+                if file_node.is_dir:
+                    continue
+                for line in self.iter_lines(file_node):
+                    if pattern.search(line):
+                        yield f"{shown}:{line.decode('utf-8', errors='replace')}"
+
+    def is_whiteout(self, name):
+        # Удален ли путь архива или один из его родительских каталогов
+        path = ""
+        for part in name.split("/"):
+            path = f"{path}/{part}" if path else part
+            if path in self.whiteouts:
+                return True
+        return False
+
+    def sync(self):
+        with self.lock:
+            return self.sync_locked()
+
+    def sync_locked(self):
+        # Один потоковый проход: архив без удаленных путей пишется во временный файл
+        # рядом с оригиналом и атомарно подменяет его
+        if not self.whiteouts:
+            return "Nothing to sync"
+        archive_dir = os.path.dirname(os.path.abspath(self.fs_archive))
+        fd, temp_archive = tempfile.mkstemp(dir=archive_dir, prefix=".tmp-", suffix=".tar")
+        self.reader.close()
+        compression = detect_compression(self.fs_archive)  # Новый архив сжимается тем же форматом
+        entries = []
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if compression is None:
+                    source, target, modes = open(self.fs_archive, 'rb'), temp_file, ('r:', 'w')
+                else:
+                    source = open_decompressed(self.fs_archive, compression)
+                    target, modes = new_compressor(temp_file, compression), ('r|', 'w|')
+                with source, tarfile.open(fileobj=source, mode=modes[0]) as tar, \
+                        tarfile.open(fileobj=target, mode=modes[1]) as tar_out:
                     for tarinfo in tar:
-                        if tarinfo.path != file_path:
-                            temp_file = tar.extractfile(tarinfo)
-                            tar_out.addfile(tarinfo, temp_file)
-            shutil.copyfile("temp_" + self.fs_archive, self.fs_archive)
-            os.remove("temp_" + self.fs_archive)
-            self.fs_structure = {}
-            self.load_virtual_fs()
-            return f"File {filename} removed"
-        else:
-            return f"File {filename} not found"
+                        self.check_cancelled()
+                        name = normalize_path(tarinfo.name)
+                        if self.is_whiteout(name):
+                            continue
+                        # Ссылки переносятся без данных: в потоковом режиме extractfile для них недоступен
+                        tar_out.addfile(tarinfo, tar.extractfile(tarinfo) if tarinfo.isreg() else None)
+                        if tarinfo.isdir():
+                            entries.append((name, True, 0, 0))
+                        elif tarinfo.isfile():
+                            # Данные в новом архиве заканчиваются на текущей позиции, выровненной на блок
+                            blocks = -(-tarinfo.size // tarfile.BLOCKSIZE)
+                            offset = tar_out.offset - blocks * tarfile.BLOCKSIZE
+                            entries.append((name, False, tarinfo.size, offset))
+                            kept = self.resolve_absolute(name)
+                            if kept is not None and not kept.is_dir:
+                                kept.offset = offset
+                if target is not temp_file:
+                    target.close()
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            shutil.copymode(self.fs_archive, temp_archive)
+            os.replace(temp_archive, self.fs_archive)
+        except BaseException:
+            if os.path.exists(temp_archive):
+                os.remove(temp_archive)
+            raise
+        removed = len(self.whiteouts)
+        self.whiteouts.clear()
+        if self.use_index:
+            write_index(self.fs_archive, entries)
+        return f"Synced {removed} change(s) to {self.fs_archive}"
 
     def cmd_clear(self):
         return "clr↑"
@@ -115,31 +479,223 @@ class ShellEmulator:
     def cmd_whoami(self):
         return self.username
 
-def run():
-    global input_area, result, output_area
-    result = emulator.execute_command(input_area.get("1.0", tk.END)[2:-1])
-    input_area.delete("1.0", tk.END)
-    input_area.insert(tk.END, "$ ")
-    if result == "clr↑":
-        output_area.delete('1.0', tk.END)
-    elif result == "Exiting...":
-        exit()
+def run_script(emulator, lines, output, timings=None, echo=True):
+    # Выполняет команды построчно и сразу пишет вывод; в timings добавляются пары (команда, секунды)
+    for line in lines:
+        command = line.strip()
+        if not command or command.startswith("#"):
+            continue
+        if echo:
+            output.write(f"$ {command}\n")
+        started = time.perf_counter()
+        chunks = []
+        for chunk in emulator.iter_command(command):
+            output.write(chunk + "\n")
+            chunks.append(chunk)
+        if timings is not None:
+            timings.append((command.split()[0], time.perf_counter() - started))
+        if chunks == ["Exiting..."]:
+            break
+
+
+def run_scripts(emulator, scripts, workers=4, timings=None):
+    # Несколько скриптов параллельно над одной загруженной файловой системой.
+    # scripts - словарь {имя: список строк}; возвращает {имя: вывод}
+    def run_one(lines):
+        output = io.StringIO()
+        run_script(emulator.session(), lines, output, timings)
+        return output.getvalue()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(run_one, lines) for name, lines in scripts.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def latency_report(timings):
+    # Задержка команд по видам: количество, среднее, медиана, 95-й процентиль, максимум (мс)
+    by_command = {}
+    for command, seconds in timings:
+        by_command.setdefault(command, []).append(seconds * 1000)
+    report = {}
+    for command, values in sorted(by_command.items()):
+        values.sort()
+        report[command] = {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+        }
+    return report
+
+
+def run_headless(emulator, script_paths, workers, timing):
+    # Пакетный режим без GUI: "-" означает стандартный ввод
+    timings = [] if timing else None
+    if len(script_paths) == 1:
+        path = script_paths[0]
+        lines = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            run_script(emulator, lines, sys.stdout, timings)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
     else:
-        output_area.insert(tk.END, result + "\n")
+        scripts = {}
+        for path in script_paths:
+            if path == "-":
+                scripts[path] = sys.stdin.readlines()
+            else:
+                with open(path, encoding="utf-8") as file:
+                    scripts[path] = file.readlines()
+        for path, output in run_scripts(emulator, scripts, workers, timings).items():
+            sys.stdout.write(f"==> {path} <==\n{output}")
+    emulator.close()
+    if timing:
+        for command, stats in latency_report(timings).items():
+            print(f"{command}: n={stats['count']} mean={stats['mean']:.3f}ms p50={stats['p50']:.3f}ms "
+                  f"p95={stats['p95']:.3f}ms max={stats['max']:.3f}ms", file=sys.stderr)
+
+
+class ShellWindow:
+    # Окно эмулятора. Команды выполняются в отдельном потоке, результаты передаются
+    # в поток Tk через очередь и root.after, поэтому окно не блокируется.
+    POLL_MS = 50
+    BATCH_LINES = 500  # Строк вывода в одном сообщении из рабочего потока
+    SPINNER = "|/-\\"
+
+    def __init__(self, root, emulator):
+        self.root = root
+        self.emulator = emulator
+        self.commands = queue.Queue()
+        self.messages = queue.Queue()
+        self.busy = False
+        self.current_command = ""
+        self.spinner_step = 0
+
+        root.title("GUI")
+        self.output_area = tk.Text(root, height=20, width=100)
+        self.output_area.pack(pady=10)
+        self.input_area = tk.Text(root, height=5, width=100)
+        self.input_area.pack(pady=10)
+        buttons = tk.Frame(root)
+        buttons.pack(pady=5)
+        tk.Button(buttons, text="Enter", command=self.submit).pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(buttons, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.status = tk.Label(root, text="")
+        self.status.pack(pady=5)
+        self.input_area.insert(tk.END, "$ ")
+
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        threading.Thread(target=self.worker, daemon=True).start()
+        root.after(self.POLL_MS, self.poll)
+
+    def submit(self):
+        command = self.input_area.get("1.0", tk.END)[2:-1]
+        self.input_area.delete("1.0", tk.END)
+        self.input_area.insert(tk.END, "$ ")
+        self.commands.put(command)
+
+    def cancel(self):
+        self.emulator.cancel_event.set()
+
+    def close(self):
+        # Текущая команда отменяется, отложенные изменения записываются в рабочем потоке
+        self.cancel()
+        self.commands.put(None)
+
+    def worker(self):
+        while True:
+            command = self.commands.get()
+            self.emulator.cancel_event.clear()
+            if command is None:
+                try:
+                    self.emulator.sync()
+                finally:
+                    self.messages.put(("exit", None))
+                return
+            self.messages.put(("start", command))
+            lines = []
+            try:
+                for chunk in self.emulator.iter_command(command):
+                    self.emulator.check_cancelled()
+                    lines.append(chunk)
+                    if len(lines) >= self.BATCH_LINES:
+                        self.messages.put(("output", lines))
+                        lines = []
+                self.messages.put(("output", lines))
+                self.messages.put(("done", None))
+            except CommandCancelled:
+                self.messages.put(("output", lines + ["Cancelled"]))
+                self.messages.put(("done", None))
+            except Exception as e:
+                self.messages.put(("output", lines + [f"Error: {e}"]))
+                self.messages.put(("done", None))
+
+    def poll(self):
+        # Обработка сообщений рабочего потока в потоке Tk; за один тик - не больше 20 пачек вывода
+        for _ in range(20):
+            try:
+                kind, payload = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "start":
+                self.set_busy(True, payload)
+            elif kind == "output":
+                if payload == ["Exiting..."]:
+                    self.root.destroy()
+                    return
+                self.show(payload)
+            elif kind == "done":
+                self.set_busy(False)
+            elif kind == "exit":
+                self.root.destroy()
+                return
+        if self.busy:
+            self.spinner_step += 1
+            self.status.config(text=f"{self.SPINNER[self.spinner_step % 4]} {self.current_command}")
+        self.root.after(self.POLL_MS, self.poll)
+
+    def show(self, lines):
+        if lines == ["clr↑"]:
+            self.output_area.delete("1.0", tk.END)
+        elif lines:
+            self.output_area.insert(tk.END, "\n".join(lines) + "\n")
+
+    def set_busy(self, busy, command=""):
+        self.busy = busy
+        self.current_command = command
+        self.cancel_button.config(state=tk.NORMAL if busy else tk.DISABLED)
+        if not busy:
+            self.status.config(text="")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Эмулятор командной строки")
     parser.add_argument('-f', '--file', required=True, help="Путь к архиву файловой системы")
-    result = ""
+    parser.add_argument('--eager', action='store_true', help="Загрузить содержимое всех файлов в память при старте")
+    parser.add_argument('--cache-size', type=int, default=16, help="Размер кэша содержимого файлов, МБ")
+    parser.add_argument('--overlay-limit', type=int, default=64,
+                        help="Количество удалений, после которого архив переписывается автоматически")
+    parser.add_argument('--no-index', action='store_true', help="Не использовать индекс архива <архив>.idx")
+    parser.add_argument('-s', '--script', action='append',
+                        help="Выполнить команды из файла без GUI (- для стандартного ввода); можно указать несколько раз")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="Количество параллельно выполняемых скриптов")
+    parser.add_argument('--timing', action='store_true', help="Вывести в stderr задержки команд")
+    parser.add_argument('--log-size', type=int, default=1000, help="Количество последних команд в журнале")
+    parser.add_argument('--log-file', help="Файл журнала команд (.jsonl или .csv), пишется в фоне")
     args = parser.parse_args()
-    emulator = ShellEmulator(args.file)
+    emulator = ShellEmulator(args.file, lazy=not args.eager, cache_bytes=args.cache_size * 1024 * 1024,
+                             overlay_limit=args.overlay_limit, use_index=not args.no_index,
+                             log_size=args.log_size, log_file=args.log_file)
+    if args.script:
+        run_headless(emulator, args.script, args.workers, args.timing)
+        sys.exit(0)
+    if tk is None:
+        print("tkinter is not available, use --script for headless mode.")
+        sys.exit(1)
     root = tk.Tk()
-    root.title("GUI")
-    output_area = tk.Text(root, height=20, width=100)
-    output_area.pack(pady=10)
-    input_area = tk.Text(root, height=5, width=100)
-    input_area.pack(pady=10)
-    copy_button = tk.Button(root, text="Enter", command=run)
-    copy_button.pack(pady=5)
-    input_area.insert(tk.END, "$ ")
-    root.mainloop()
\ No newline at end of file
+    ShellWindow(root, emulator)
+    root.mainloop()
+    emulator.close()
@@ -1,7 +1,39 @@
 import unittest
+import gzip
+import io
+import json
 import os
-from shell_emulator import ShellEmulator
+import tarfile
+from archive_reader import ArchiveReader
+from seek_index import detect_compression
+from shell_emulator import CommandCancelled, ShellEmulator, run_script, run_scripts, latency_report
 import shutil
+import sys
+
+
+def remove_archive(path):
+    # Архив вместе с индексом рядом с ним
+    for name in (path, path + ".idx"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def make_archive(path, files, dirs=(), symlinks=None):
+    # Архив из каталогов dirs, файлов {путь: содержимое} и символических ссылок {путь: цель}
+    with tarfile.open(path, 'w') as tar:
+        for name in dirs:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.DIRTYPE
+            tar.addfile(info)
+        for name, target in (symlinks or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
 
 class TestShellEmulator(unittest.TestCase):
 
@@ -10,11 +42,10 @@ class TestShellEmulator(unittest.TestCase):
         self.emulator = ShellEmulator('test_filesystem.tar')
 
     def tearDown(self):
-        os.remove("test_filesystem.tar")
-        pass
+        remove_archive("test_filesystem.tar")
 
     def test_load_virtual_fs(self):
-        self.assertTrue(len(self.emulator.fs_structure) != 0)
+        self.assertTrue(len(self.emulator.fs_structure.children) != 0)
 
     def test_ls_command(self):
         result = self.emulator.execute_command('ls')
@@ -53,5 +84,223 @@ class TestShellEmulator(unittest.TestCase):
         result = self.emulator.execute_command('whoami')
         self.assertEqual(result, "invertie")
 
+    def test_nested_directories(self):
+        # dir1 не должен видеть детей dir10, промежуточные каталоги создаются без явных записей
+        make_archive("test_nested.tar", {
+            "dir1/a.txt": b"a",
+            "dir10/b.txt": b"b",
+            "./deep/er/c.txt": b"c",
+        }, dirs=["dir1/", "dir10/"])
+        try:
+            emulator = ShellEmulator("test_nested.tar")
+            emulator.execute_command('cd dir1')
+            self.assertEqual(emulator.execute_command('ls'), "a.txt")
+            self.assertEqual(emulator.execute_command('cd ../deep/er'), "Changed directory to deep/er")
+            self.assertEqual(emulator.execute_command('ls'), "c.txt")
+            emulator.execute_command('cd /')
+            self.assertEqual(emulator.execute_command('ls').split('\n'), ["deep", "dir1", "dir10"])
+            self.assertEqual(emulator.execute_command('rm dir10'), "File dir10 removed")
+            emulator.execute_command('sync')
+            with tarfile.open("test_nested.tar") as tar:
+                self.assertEqual(tar.getnames(), ["dir1", "dir1/a.txt", "./deep/er/c.txt"])
+        finally:
+            remove_archive("test_nested.tar")
+
+    def test_lazy_read(self):
+        # Содержимое читается по запросу через кэш, двоичные данные не декодируются,
+        # смещения остаются верными после удаления файла
+        binary = bytes(range(256)) * 5
+        make_archive("test_lazy.tar", {"a.bin": binary, "b.txt": b"hello", "c.txt": b"world"})
+        try:
+            emulator = ShellEmulator("test_lazy.tar")
+            self.assertIsNone(emulator.resolve("a.bin").content)
+            self.assertEqual(emulator.read_file(emulator.resolve("a.bin")), binary)
+            self.assertEqual(emulator.read_file(emulator.resolve("c.txt")), b"world")
+            self.assertEqual(emulator.read_file(emulator.resolve("c.txt")), b"world")
+            self.assertEqual(emulator.reader.cache.hits, 1)
+
+            emulator.execute_command('rm a.bin')
+            emulator.execute_command('sync')
+            self.assertEqual(emulator.read_file(emulator.resolve("b.txt")), b"hello")
+            self.assertEqual(emulator.read_file(emulator.resolve("c.txt")), b"world")
+            emulator.reader.close()
+        finally:
+            remove_archive("test_lazy.tar")
+
+    def test_rm_overlay(self):
+        # rm виден сразу, архив переписывается только при sync или переполнении слоя
+        make_archive("test_overlay.tar", {"a.txt": b"a", "b.txt": b"b", "c.txt": b"c"})
+        try:
+            emulator = ShellEmulator("test_overlay.tar", overlay_limit=2)
+            emulator.execute_command('rm a.txt')
+            self.assertEqual(emulator.execute_command('ls').split('\n'), ["b.txt", "c.txt"])
+            with tarfile.open("test_overlay.tar") as tar:
+                self.assertEqual(tar.getnames(), ["a.txt", "b.txt", "c.txt"])
+
+            emulator.execute_command('rm b.txt')
+            with tarfile.open("test_overlay.tar") as tar:
+                self.assertEqual(tar.getnames(), ["c.txt"])
+            self.assertEqual(emulator.execute_command('sync'), "Nothing to sync")
+            self.assertEqual(os.listdir(".").count("test_overlay.tar"), 1)
+            self.assertFalse([name for name in os.listdir(".") if name.startswith(".tmp-")])
+        finally:
+            remove_archive("test_overlay.tar")
+
+    def test_index_sidecar(self):
+        # Индекс переиспользуется для неизмененного архива и перестраивается для измененного
+        make_archive("test_index.tar", {"a.txt": b"a", "d/b.txt": b"bb"}, dirs=["d/"])
+        try:
+            ShellEmulator("test_index.tar")
+            self.assertTrue(os.path.exists("test_index.tar.idx"))
+            with open("test_index.tar.idx", "rb") as f:
+                index = f.read()
+
+            emulator = ShellEmulator("test_index.tar")
+            emulator.execute_command('cd d')
+            self.assertEqual(emulator.execute_command('ls'), "b.txt")
+            self.assertEqual(emulator.read_file(emulator.resolve("b.txt")), b"bb")
+            emulator.reader.close()
+
+            make_archive("test_index.tar", {"a.txt": b"a", "c.txt": b"c"})
+            emulator = ShellEmulator("test_index.tar")
+            self.assertEqual(emulator.execute_command('ls').split('\n'), ["a.txt", "c.txt"])
+
+            with open("test_index.tar.idx", "r+b") as f:
+                f.seek(len(index) - 1)
+                f.write(b"?")
+            emulator = ShellEmulator("test_index.tar")
+            self.assertEqual(emulator.execute_command('ls').split('\n'), ["a.txt", "c.txt"])
+        finally:
+            remove_archive("test_index.tar")
+
+    def test_cancel_sync(self):
+        # Отмененная запись архива не портит его и сохраняет отложенные удаления
+        make_archive("test_cancel.tar", {"a.txt": b"a", "b.txt": b"b"})
+        try:
+            emulator = ShellEmulator("test_cancel.tar")
+            emulator.execute_command('rm a.txt')
+            emulator.cancel_event.set()
+            with self.assertRaises(CommandCancelled):
+                emulator.execute_command('sync')
+            with tarfile.open("test_cancel.tar") as tar:
+                self.assertEqual(tar.getnames(), ["a.txt", "b.txt"])
+            self.assertFalse([name for name in os.listdir(".") if name.startswith(".tmp-")])
+
+            emulator.cancel_event.clear()
+            emulator.execute_command('sync')
+            with tarfile.open("test_cancel.tar") as tar:
+                self.assertEqual(tar.getnames(), ["b.txt"])
+        finally:
+            remove_archive("test_cancel.tar")
+
+    def test_headless_scripts(self):
+        # Скрипты без GUI, в том числе параллельно над одной загруженной файловой системой
+        output = io.StringIO()
+        timings = []
+        run_script(self.emulator, ["# комментарий", "whoami", "", "cd directory", "exit", "ls"], output, timings)
+        self.assertEqual(output.getvalue(),
+                         "$ whoami\ninvertie\n$ cd directory\nChanged directory to directory\n$ exit\nExiting...\n")
+        self.assertEqual([command for command, _ in timings], ["whoami", "cd", "exit"])
+
+        outputs = run_scripts(self.emulator, {
+            "first": ["cd directory", "ls"],
+            "second": ["ls", "rm file2.txt", "ls"],
+        }, workers=2, timings=timings)
+        self.assertEqual(outputs["first"], "$ cd directory\nChanged directory to directory\n$ ls\n")
+        self.assertTrue(outputs["second"].endswith("$ ls\ndirectory\nfile1.txt\n"))
+        self.assertEqual(self.emulator.current_directory, "directory")
+        self.assertEqual(latency_report(timings)["ls"]["count"], 3)
+
+    def test_command_log(self):
+        # Журнал ограничен по размеру и пишется в JSON Lines в фоновом потоке
+        emulator = ShellEmulator("test_filesystem.tar", log_size=2, log_file="test_log.jsonl")
+        try:
+            emulator.execute_command('cd directory')
+            emulator.execute_command('cd missing')
+            emulator.execute_command('whoami')
+            self.assertEqual([entry.command for entry in emulator.log_actions], ["cd missing", "whoami"])
+            self.assertEqual(emulator.log_actions[0].status, "error")
+            self.assertEqual(emulator.log_actions[0].cwd, "directory")
+            emulator.close()
+
+            with open("test_log.jsonl", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([record["status"] for record in records], ["ok", "error", "ok"])
+            self.assertEqual(records[0]["command"], "cd directory")
+            self.assertGreaterEqual(float(records[0]["duration"]), 0)
+        finally:
+            os.remove("test_log.jsonl")
+
+    def test_compressed_archive(self):
+        # Чтение из gzip-архива по индексу точек входа; sync сохраняет сжатие
+        files = {f"dir/file{i}.txt": "".join(f"{(i * 31 + j) ** 3 % 99991}\n" for j in range(i * 50)).encode()
+                 for i in range(1, 40)}
+        make_archive("test_filesystem.tar", files, dirs=["dir"], symlinks={"dir/link": "file1.txt"})
+        with open("test_filesystem.tar", "rb") as f:
+            data = f.read()
+        with open("test_compressed.tar.gz", "wb") as f:
+            f.write(gzip.compress(data))
+        try:
+            reader = ArchiveReader("test_compressed.tar.gz", cache_bytes=0, span=4096)
+            with reader.scan() as source, tarfile.open(fileobj=source, mode="r|") as tar:
+                members = {member.name: (member.offset_data, member.size) for member in tar if member.isfile()}
+            self.assertEqual(reader.compression, "gz")
+            self.assertGreater(len(reader.index.positions), 2)
+            for name in reversed(list(files)):
+                self.assertEqual(reader.read(*members[name]), files[name])
+            reader.close()
+
+            emulator = ShellEmulator("test_compressed.tar.gz", use_index=False)
+            self.assertEqual(emulator.read_file(emulator.resolve("dir/file7.txt")), files["dir/file7.txt"])
+            emulator.execute_command("rm dir/file1.txt")
+            emulator.close()
+            self.assertEqual(detect_compression("test_compressed.tar.gz"), "gz")
+            emulator = ShellEmulator("test_compressed.tar.gz", use_index=False)
+            self.assertIsNone(emulator.resolve("dir/file1.txt"))
+            with tarfile.open("test_compressed.tar.gz") as tar:
+                self.assertEqual(tar.getmember("dir/link").linkname, "file1.txt")
+                self.assertNotIn("dir/file1.txt", tar.getnames())
+            self.assertEqual(emulator.read_file(emulator.resolve("dir/file39.txt")), files["dir/file39.txt"])
+            emulator.close()
+        finally:
+            remove_archive("test_compressed.tar.gz")
+
+    def test_find_du_cat_grep(self):
+        # Поиск по дереву, размеры по агрегатам каталогов и grep по файлу больше куска чтения
+        big = b"".join(b"row %d\n" % i for i in range(20000))  # ~170 КБ, строки пересекают границы кусков
+        make_archive("test_filesystem.tar", {"a/b/big.log": big, "a/b/c.txt": b"hello\nworld\n", "a/d.txt": b"hi"},
+                     dirs=["a", "a/b", "empty"])
+        emulator = ShellEmulator("test_filesystem.tar")
+        self.assertEqual(emulator.execute_command("find / -name *.txt"), "/a/b/c.txt\n/a/d.txt")
+        self.assertEqual(emulator.execute_command("find a -type d"), "a\na/b")
+        self.assertEqual(emulator.execute_command("du a").split("\n"),
+                         [f"{len(big) + 12}\ta/b", "2\ta/d.txt", f"{len(big) + 14}\ta"])
+        self.assertEqual(emulator.execute_command("cat a/b/c.txt"), "hello\nworld")
+        self.assertEqual(emulator.execute_command("grep ^row.1999[0-9]$ a"),
+                         "\n".join(f"a/b/big.log:row {i}" for i in range(19990, 20000)))
+        self.assertEqual(emulator.execute_command("grep -i WORLD"), "./a/b/c.txt:world")
+
+        emulator.execute_command("rm a/b/big.log")
+        self.assertEqual(emulator.execute_command("du /").split("\n")[-1], "14\t/")
+        self.assertEqual(emulator.execute_command("cat a/b"), "cat: a/b: Is a directory")
+
+    def test_concurrent_rm_find(self):
+        # find/du в одной сессии и rm тех же файлов в другой не падают на удаленных узлах
+        make_archive("test_filesystem.tar", {f"d/f{i}.txt": b"x" for i in range(2000)}, dirs=["d"])
+        emulator = ShellEmulator("test_filesystem.tar", overlay_limit=5000)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # Частое переключение потоков, чтобы rm попадал внутрь обхода
+        try:
+            outputs = run_scripts(emulator, {
+                "reader": ["find d", "du d", "ls"] * 200,
+                "writer": [f"rm d/f{i}.txt" for i in range(2000)],
+            }, workers=2)
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertNotIn("Error", outputs["reader"])
+        self.assertEqual(outputs["writer"].count("removed"), 2000)
+        self.assertEqual(emulator.execute_command("find d"), "d")
+        emulator.close()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,188 @@
+import argparse
+import functools
+import gzip
+import io
+import json
+import os
+import platform
+import random
+import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from visualizer import iter_index_lines, open_url, parse_packages
+
+
+def tar_member(name, data):
+    # Член tar без маркера конца архива (так устроены части APKINDEX.tar.gz)
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()[:tarfile.BLOCKSIZE + -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE]
+
+
+def generate_index(path, count, seed=0, prefix="pkg"):
+    # Синтетический APKINDEX.tar.gz из count пакетов: как в настоящем индексе, это
+    # gzip-поток с подписью и следом gzip-поток с описанием и самим APKINDEX.
+    # Пакеты зависят от пакетов с меньшими номерами напрямую и через so:/cmd:.
+    rng = random.Random(seed)
+    lines = []
+    for index in range(count):
+        name = f"{prefix}{index}"
+        deps = []
+        for dep in rng.sample(range(index), min(index, rng.randrange(6))):
+            kind = rng.randrange(3)
+            deps.append(f"so:lib{prefix}{dep}.so.1" if kind == 0 else f"cmd:{prefix}tool{dep}" if kind == 1
+                        else f"{prefix}{dep}>=1.0")
+        lines += [
+            f"C:Q1{rng.getrandbits(160):040x}=",
+            f"P:{name}",
+            f"V:1.{index}-r0",
+            "A:x86_64",
+            f"S:{rng.randrange(1, 10**6)}",
+            f"I:{rng.randrange(1, 10**7)}",
+            f"T:Synthetic package number {index}",
+            "U:https://example.org/",
+            "L:MIT",
+            f"o:{name}",
+            "m:Benchmark <bench@example.org>",
+            f"t:{1700000000 + index}",
+            f"D:{' '.join(deps)}",
+            f"p:so:lib{name}.so.1=1.0 cmd:{prefix}tool{index}={index}",
+            "",
+        ]
+    index_data = ("\n".join(lines) + "\n").encode("utf-8")
+
+    signature = tar_member(".SIGN.RSA.bench.rsa.pub", bytes(rng.getrandbits(8) for _ in range(256)))
+    body = io.BytesIO()
+    with tarfile.open(fileobj=body, mode="w") as tar:
+        for name, data in (("DESCRIPTION", b"synthetic"), ("APKINDEX", index_data)):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    with open(path, "wb") as file:
+        file.write(gzip.compress(signature))
+        file.write(gzip.compress(body.getvalue()))
+    return len(index_data)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def log_request(self, code="-", size="-"):
+        if self.server.log is not None:
+            self.server.log.append((self.path, int(code)))
+
+    def do_GET(self):
+        # Первые failures[путь] запросов к пути завершаются ошибкой 503, следующие truncated[путь] -
+        # обрывом соединения на середине тела (проверка повторов)
+        if self.server.failures.get(self.path, 0) > 0:
+            self.server.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        if self.server.truncated.get(self.path, 0) > 0:
+            self.server.truncated[self.path] -= 1
+            with open(self.translate_path(self.path), "rb") as file:
+                data = file.read()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = True
+            return
+        super().do_GET()
+
+
+@contextmanager
+def serve_directory(directory, log=None, failures=None, truncated=None):
+    # Локальная замена зеркала Alpine: HTTP-сервер на свободном порту; отдает базовый URL.
+    # В log (если передан) дописываются пары (путь, код ответа)
+    handler = functools.partial(QuietHandler, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.log = log
+    server.failures = failures if failures is not None else {}
+    server.truncated = truncated if truncated is not None else {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def parse_streaming(url):
+    with open_url(url) as stream:
+        return parse_packages(iter_index_lines(stream))
+
+
+def parse_materialized(url):
+    # Прежний подход для сравнения: архив целиком в памяти, затем все строки списком
+    with open_url(url) as stream:
+        data = io.BytesIO(stream.read())
+    with tarfile.open("rb", fileobj=data, encoding="utf-8") as tar:
+        return parse_packages(tar.extractfile("APKINDEX").readlines())
+
+
+def measure(func, *args):
+    # Время и пиковый прирост памяти (tracemalloc) одного вызова
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        func(*args)
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_benchmark(count, http=False, seed=0):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = Path(workdir) / "edge" / "main" / "x86_64" / "APKINDEX.tar.gz"
+        path.parent.mkdir(parents=True)
+        index_bytes = generate_index(path, count, seed)
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "packages": count,
+            "index_bytes": index_bytes,
+            "archive_bytes": os.path.getsize(path),
+            "transport": "http" if http else "file",
+            "pipelines": {},
+        }
+        with serve_directory(workdir) if http else nullcontext(Path(workdir).as_uri()) as base_url:
+            url = f"{base_url}/edge/main/x86_64/APKINDEX.tar.gz"
+            for name, func in (("streaming", parse_streaming), ("materialized", parse_materialized)):
+                seconds, peak = measure(func, url)
+                report["pipelines"][name] = {
+                    "seconds": seconds,
+                    "packages_per_second": count / seconds,
+                    "peak_memory_bytes": peak,
+                }
+        return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки и разбора APKINDEX.")
+    parser.add_argument("-n", "--packages", type=int, default=20000, help="Количество пакетов в индексе")
+    parser.add_argument("--http", action="store_true", help="Отдавать индекс через локальный HTTP-сервер")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора индекса")
+    parser.add_argument("-o", "--output", help="Путь к JSON-файлу с результатами")
+
+    args = parser.parse_args()
+    report = run_benchmark(args.packages, args.http, args.seed)
+    for name, stats in report["pipelines"].items():
+        print(f"{name}: {stats['seconds']:.3f} с, {stats['packages_per_second']:.0f} пакетов/с, "
+              f"пик памяти {stats['peak_memory_bytes']} байт")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
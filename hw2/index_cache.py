@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+PARSED_VERSION = 2  # Увеличивается при изменении формата результата parse_packages
+
+
+class IndexCache:
+    # Кэш APKINDEX на диске. Для каждого URL хранятся сырой индекс (<ключ>.tar.gz) и
+    # метаданные (<ключ>.json: ETag, Last-Modified, время загрузки и использования,
+    # контрольная сумма). Разобранная таблица зависимостей хранится отдельно в
+    # parsed-<sha256>-<версия>.pickle, поэтому одинаковые индексы разбираются один раз.
+    def __init__(self, directory, max_age=3600, max_entries=16, evict_after=30 * 24 * 3600):
+        self.directory = directory
+        self.max_age = max_age  # Сколько секунд индекс считается свежим без запроса к серверу
+        self.max_entries = max_entries  # Сколько индексов (дистрибутив/репозиторий/архитектура) хранить
+        self.evict_after = evict_after  # Индексы, не использованные дольше, удаляются
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+    def meta_path(self, url):
+        return os.path.join(self.directory, self.key(url) + ".json")
+
+    def raw_path(self, url):
+        return os.path.join(self.directory, self.key(url) + ".tar.gz")
+
+    def parsed_path(self, checksum):
+        return os.path.join(self.directory, f"parsed-{checksum}-{PARSED_VERSION}.pickle")
+
+    def load_meta(self, url):
+        try:
+            with open(self.meta_path(url), encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, meta):
+        return time.time() - meta["fetched_at"] < self.max_age
+
+    def save_meta(self, url, meta):
+        meta["used_at"] = time.time()
+        self.replace(self.meta_path(url), json.dumps(meta).encode("utf-8"))
+
+    def load_parsed(self, checksum):
+        try:
+            with open(self.parsed_path(checksum), "rb") as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def save_parsed(self, checksum, table):
+        self.replace(self.parsed_path(checksum), pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def open_raw(self, url):
+        # Запись сырого индекса во временный файл; commit_raw подменяет им прежний
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        return HashingWriter(os.fdopen(fd, "wb"), temp_path)
+
+    def commit_raw(self, url, writer):
+        writer.close()
+        os.replace(writer.path, self.raw_path(url))
+        return writer.hexdigest()
+
+    def replace(self, path, data):
+        # Атомарная запись: другой процесс видит либо старый файл, либо новый целиком
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def evict(self):
+        with self.lock:
+            self.evict_locked()
+
+    def evict_locked(self):
+        # Удаляются индексы сверх max_entries (давно использованные первыми), неиспользуемые
+        # дольше evict_after, а затем разобранные таблицы, на которые не ссылается ни один индекс
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as file:
+                        entries.append((json.load(file), name[:-len(".json")]))
+                except (OSError, ValueError):
+                    entries.append(({"used_at": 0}, name[:-len(".json")]))
+        entries.sort(key=lambda entry: entry[0].get("used_at", 0), reverse=True)
+        now = time.time()
+        kept = set()
+        for position, (meta, key) in enumerate(entries):
+            if position < self.max_entries and now - meta.get("used_at", 0) < self.evict_after:
+                kept.add(f"parsed-{meta.get('checksum')}-{PARSED_VERSION}.pickle")
+                continue
+            for suffix in (".json", ".tar.gz"):
+                path = os.path.join(self.directory, key + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+        for name in os.listdir(self.directory):
+            if name.startswith("parsed-") and name not in kept:
+                os.remove(os.path.join(self.directory, name))
+
+
+class HashingWriter:
+    # Файл, по мере записи считающий SHA-256 содержимого
+    def __init__(self, file, path):
+        self.file = file
+        self.path = path
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class TeeReader:
+    # Поток, который при чтении копирует прочитанные байты в writer
+    def __init__(self, stream, writer):
+        self.stream = stream
+        self.writer = writer
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.writer.write(data)
+        return data
+
+    def drain(self, chunk_size=64 * 1024):
+        while self.read(chunk_size):
+            pass
@@ -0,0 +1,97 @@
+import re
+from collections import defaultdict
+
+# Ограничение версии в имени зависимости или в p:-строке: so:libc.musl-x86_64.so.1=1.2.5, curl>=8.0, py3-foo~1
+VERSION_CONSTRAINT = re.compile(r"[<>=~]")
+
+
+def strip_version(name):
+    return VERSION_CONSTRAINT.split(name, 1)[0]
+
+
+class PackageIndex:
+    # Пакеты APKINDEX: исходные зависимости (D:), индекс виртуальных имен (so:, cmd:, pc: и т.п.
+    # из p:-строк) -> предоставляющие их пакеты и приоритеты провайдеров (k:).
+    # Ведет себя как словарь пакет -> список пакетов-зависимостей: виртуальные имена
+    # разрешаются через индекс за O(1), результат запоминается.
+    def __init__(self):
+        self.dependencies = defaultdict(list)
+        self.provides = defaultdict(list)
+        self.priorities = {}
+        self.resolved = {}
+
+    def add_package(self, package):
+        self.dependencies[package]  # Пакет без D:-строки тоже известен
+
+    def add_dependencies(self, package, line):
+        for dep in line.split():
+            if not dep.startswith("!"):  # "!имя" - конфликт, а не зависимость
+                self.dependencies[package].append(strip_version(dep))
+
+    def add_provides(self, package, line):
+        for name in line.split():
+            self.provides[strip_version(name)].append(package)
+
+    def merge(self, other):
+        # Добавляет пакеты другого репозитория; при совпадении имен остается пакет из
+        # репозитория, добавленного раньше (порядок репозиториев в конфигурации - приоритет)
+        for package, deps in other.dependencies.items():
+            if package not in self.dependencies:
+                self.dependencies[package] = list(deps)
+                if package in other.priorities:
+                    self.priorities[package] = other.priorities[package]
+        for name, providers in other.provides.items():
+            known = self.provides[name]
+            known.extend(package for package in providers if package not in known)
+        self.resolved.clear()
+        return self
+
+    def resolve(self, name):
+        # Пакет, удовлетворяющий зависимости name, или None: сам пакет с таким именем,
+        # иначе провайдер с наибольшим приоритетом (при равенстве - первый в индексе)
+        if name in self.dependencies:
+            return name
+        providers = self.provides.get(name)
+        if not providers:
+            return None
+        return max(providers, key=lambda package: self.priorities.get(package, 0))
+
+    def get(self, package, default=None):
+        if package not in self.dependencies:
+            return default
+        deps = self.resolved.get(package)
+        if deps is None:
+            # Неразрешимые имена остаются как есть, чтобы отсутствующая зависимость была видна в графе
+            deps = []
+            seen = {package}
+            for name in self.dependencies[package]:
+                provider = self.resolve(name) or name
+                if provider not in seen:
+                    seen.add(provider)
+                    deps.append(provider)
+            self.resolved[package] = deps
+        return deps
+
+    def __getitem__(self, package):
+        deps = self.get(package)
+        if deps is None:
+            raise KeyError(package)
+        return deps
+
+    def __contains__(self, package):
+        return package in self.dependencies
+
+    def __iter__(self):
+        return iter(self.dependencies)
+
+    def __len__(self):
+        return len(self.dependencies)
+
+    def items(self):
+        return ((package, self[package]) for package in self.dependencies)
+
+    def __eq__(self, other):
+        if not isinstance(other, PackageIndex):
+            return NotImplemented
+        return (self.dependencies, self.provides, self.priorities) == \
+            (other.dependencies, other.provides, other.priorities)
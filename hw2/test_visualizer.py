@@ -1,5 +1,20 @@
 import unittest
-from visualizer import read_config, generate_mermaid_graph, download_data
+import tempfile
+from pathlib import Path
+import io
+import json
+import os
+import stat
+import sys
+import time
+import requests
+from visualizer import read_config, read_cache_config, generate_mermaid_graph, download_data, parse_packages, \
+    load_dependencies, build_dependency_graph, read_repositories, DependencyGraphBuilder, load_repositories, \
+    read_fetch_config, transitive_reduction, collapse_graph, write_graph, read_output_config
+from writers import write_dot, write_json
+from package_index import PackageIndex
+from index_cache import IndexCache
+from benchmark import generate_index, serve_directory
 
 class TestVisualizer(unittest.TestCase):
     def test_read_config(self):
@@ -8,8 +23,17 @@ class TestVisualizer(unittest.TestCase):
         self.assertEqual(config[4], 3)
 
     def test_download_data(self):
-        packages_data = download_data("http://dl-cdn.alpinelinux.org/alpine", "edge", "main", "x86_64")
-        self.assertTrue(packages_data != None)
+        # Генератор ленивый: строки индекса читаются только при итерации (локальный сервер вместо зеркала)
+        with tempfile.TemporaryDirectory() as workdir:
+            path = Path(workdir) / "edge" / "main" / "x86_64" / "APKINDEX.tar.gz"
+            path.parent.mkdir(parents=True)
+            generate_index(path, 5)
+            with serve_directory(workdir) as base_url:
+                packages_data = download_data(base_url, "edge", "main", "x86_64")
+                self.assertTrue(next(packages_data).startswith(b"C:"))
+                packages_data.close()
+                with self.assertRaises(requests.HTTPError):
+                    next(download_data(base_url, "edge", "missing", "x86_64"))
 
     def build_dependency_graph(self):
         deps = [("curl", "libcurl"), ("libcurl", "openssl")]
@@ -17,5 +41,149 @@ class TestVisualizer(unittest.TestCase):
         expected = "graph TD\n    curl --> libcurl\n    libcurl --> openssl"
         self.assertEqual(mermaid_code.strip(), expected)
 
+    def test_download_stream(self):
+        # Индекс с локального HTTP-сервера и по file:// разбирается по мере распаковки
+        with tempfile.TemporaryDirectory() as workdir:
+            path = Path(workdir) / "edge" / "main" / "x86_64" / "APKINDEX.tar.gz"
+            path.parent.mkdir(parents=True)
+            generate_index(path, 50)
+            with serve_directory(workdir) as base_url:
+                lines = download_data(base_url, "edge", "main", "x86_64")
+                self.assertTrue(next(lines).startswith(b"C:"))
+                self.assertEqual(next(lines), b"P:pkg0\n")
+                dependencies = parse_packages(lines)
+            self.assertIn("pkg49", dependencies)
+            local = parse_packages(download_data(Path(workdir).as_uri(), "edge", "main", "x86_64"))
+            self.assertEqual(local["pkg49"], dependencies["pkg49"])
+
+    def test_index_cache(self):
+        # Свежий индекс берется из кэша без запроса, устаревший - условным запросом (304),
+        # измененный на сервере загружается и разбирается заново
+        log = []
+        with tempfile.TemporaryDirectory() as workdir:
+            path = Path(workdir) / "edge" / "main" / "x86_64" / "APKINDEX.tar.gz"
+            path.parent.mkdir(parents=True)
+            generate_index(path, 30)
+            os.utime(path, (time.time() - 60, time.time() - 60))
+            cache = IndexCache(os.path.join(workdir, "cache"), max_age=3600)
+            with serve_directory(workdir, log) as base_url:
+                first = load_dependencies(base_url, "edge", "main", "x86_64", cache)
+                self.assertEqual(load_dependencies(base_url, "edge", "main", "x86_64", cache), first)
+                self.assertEqual([code for _, code in log], [200])
+
+                cache.max_age = 0
+                self.assertEqual(load_dependencies(base_url, "edge", "main", "x86_64", cache), first)
+                self.assertEqual([code for _, code in log], [200, 304])
+
+                generate_index(path, 40)
+                self.assertIn("pkg39", load_dependencies(base_url, "edge", "main", "x86_64", cache))
+                self.assertEqual([code for _, code in log], [200, 304, 200])
+            self.assertEqual(len([name for name in os.listdir(cache.directory) if name.startswith("parsed-")]), 1)
+        self.assertEqual(read_cache_config("config.xml")[:2], (".apkcache", 3600))
+
+    def test_provides_index(self):
+        # so:/cmd:-зависимости разрешаются в пакеты через p:-строки с учетом приоритета k:
+        index = parse_packages(line.encode() + b"\n" for line in [
+            "P:curl", "D:so:libcurl.so.4 so:libc.musl-x86_64.so.1 cmd:sh ca-certificates>=2020 !curl-doc", "",
+            "P:libcurl", "D:so:libc.musl-x86_64.so.1", "p:so:libcurl.so.4=4.8.0", "",
+            "P:musl", "p:so:libc.musl-x86_64.so.1=1", "",
+            "P:dash-binsh", "p:cmd:sh=1", "k:60", "",
+            "P:busybox-binsh", "p:cmd:sh=1 /bin/sh", "k:100", "",
+            "P:ca-certificates", "",
+        ])
+        self.assertEqual(index.provides["so:libcurl.so.4"], ["libcurl"])
+        self.assertEqual(index.resolve("cmd:sh"), "busybox-binsh")
+        self.assertEqual(index["curl"], ["libcurl", "musl", "busybox-binsh", "ca-certificates"])
+        self.assertEqual(index.get("missing", []), [])
+        graph = build_dependency_graph("curl", index, 3)
+        self.assertEqual(graph["libcurl"], ["musl"])
+
+    def test_multi_root_graph(self):
+        # Глубина считается по кратчайшему пути, длинные цепочки не упираются в рекурсию,
+        # замыкания с циклами запоминаются для всех пакетов компоненты
+        dependencies = {"a": ["b", "d"], "b": ["c"], "c": ["d"], "d": ["e"], "x": ["c"]}
+        graph = build_dependency_graph("a", dependencies, 1)
+        self.assertEqual(dict(graph), {"a": ["b", "d"], "b": ["c"], "d": ["e"]})
+        self.assertEqual(dict(build_dependency_graph(["a", "x"], dependencies, 0)), {"a": ["b", "d"], "x": ["c"]})
+
+        chain = {f"p{i}": [f"p{i + 1}"] for i in range(5000)}
+        self.assertEqual(len(build_dependency_graph("p0", chain)), 5000)
+
+        cyclic = {"a": ["b"], "b": ["c"], "c": ["a", "d"], "d": [], "r": ["b"]}
+        builder = DependencyGraphBuilder(cyclic)
+        self.assertEqual(builder.closure("r"), {"r", "a", "b", "c", "d"})
+        self.assertIs(builder.closures["a"], builder.closures["c"])
+        self.assertEqual(set(builder.graphs(["a", "d"])["a"]), {"a", "b", "c"})
+        self.assertEqual(len(DependencyGraphBuilder(chain).closure("p0")), 5001)
+
+        main, community = PackageIndex(), PackageIndex()
+        main.add_dependencies("curl", "so:libcurl.so.4")
+        community.add_dependencies("libcurl", "")
+        community.add_provides("libcurl", "so:libcurl.so.4=4")
+        community.add_dependencies("curl", "other")
+        self.assertEqual(main.merge(community)["curl"], ["libcurl"])
+        self.assertEqual(read_repositories("config.xml"), [("edge", "main", "x86_64")])
+
+    def test_parallel_fetch(self):
+        # Несколько индексов загружаются параллельно, временная ошибка 503 и обрыв тела повторяются,
+        # результаты объединяются в порядке репозиториев
+        repositories = [("edge", "main", "x86_64"), ("edge", "community", "x86_64"), ("v3.20", "main", "aarch64")]
+        log = []
+        with tempfile.TemporaryDirectory() as workdir:
+            for number, (distro, component, arch) in enumerate(repositories):
+                path = Path(workdir) / distro / component / arch / "APKINDEX.tar.gz"
+                path.parent.mkdir(parents=True)
+                generate_index(path, 20, seed=number, prefix=f"{component}{number}-")
+            failures = {"/edge/community/x86_64/APKINDEX.tar.gz": 1}
+            truncated = {"/v3.20/main/aarch64/APKINDEX.tar.gz": 1}
+            with serve_directory(workdir, log, failures, truncated) as base_url:
+                index = load_repositories(base_url, repositories, workers=3, retries=2, backoff=0.01)
+        self.assertEqual(len(index), 60)
+        self.assertIn("community1-19", index)
+        self.assertEqual(index.resolve("so:libmain2-5.so.1"), "main2-5")
+        self.assertEqual(sorted(code for _, code in log), [200, 200, 200, 200, 503])
+        self.assertEqual(truncated, {"/v3.20/main/aarch64/APKINDEX.tar.gz": 0})
+        self.assertEqual(read_fetch_config("config.xml"), (4, 3, 0.5))
+
+    def test_graph_output(self):
+        # Повторные ребра пишутся один раз, транзитивные ребра и большие узлы убираются,
+        # DOT передается в программу визуализации через канал
+        graph = {"curl": ["libcurl", "musl", "libcurl"], "libcurl": ["musl", "so:libz.so.1"], "so:libz.so.1": ["musl"]}
+        self.assertEqual(generate_mermaid_graph(graph),
+                         'graph TD\n    curl --> libcurl\n    curl --> musl\n    libcurl --> musl\n'
+                         '    libcurl --> n3["so:libz.so.1"]\n    n3 --> musl')
+        buffer = io.StringIO()
+        write_json(graph, buffer)
+        self.assertEqual(json.loads(buffer.getvalue())["graph"]["curl"], ["libcurl", "musl"])
+        buffer = io.StringIO()
+        write_dot({"curl": ["libcurl", "libcurl"], 'a"b': ["c"]}, buffer, {"curl": "curl (+1)"})
+        self.assertEqual(buffer.getvalue(), 'digraph dependencies {\n    "curl" [label="curl (+1)"];\n'
+                                            '    "curl" -> "libcurl";\n    "a\\"b" -> "c";\n}\n')
+
+        self.assertEqual(dict(transitive_reduction(graph)),
+                         {"curl": ["libcurl"], "libcurl": ["so:libz.so.1"], "so:libz.so.1": ["musl"]})
+        cyclic = {"a": ["b", "c"], "b": ["c"], "c": ["b", "d"], "d": []}
+        self.assertEqual(dict(transitive_reduction(cyclic)), {"a": ["b", "c"], "b": ["c"], "c": ["b", "d"]})
+
+        star = {"root": ["a", "b", "c"], "a": ["hub", "deep"], "b": ["hub"], "c": ["hub"], "deep": ["deeper"],
+                "hub": ["x"], "x": ["y"], "y": ["z"]}
+        collapsed, labels = collapse_graph(star, "root", max_depth=1, max_fan_in=2)
+        self.assertEqual(dict(collapsed), {"root": ["a", "b", "c"]})
+        self.assertEqual(labels, {"a": "a (+2)"})
+        collapsed, labels = collapse_graph(star, "root", max_depth=2, max_fan_in=2)
+        self.assertEqual(dict(collapsed), {"root": ["a", "b", "c"], "a": ["deep"]})
+        self.assertEqual(labels, {"hub": "hub (3 dependents) (+3)", "deep": "deep (+1)"})
+
+        with tempfile.TemporaryDirectory() as workdir:
+            renderer = os.path.join(workdir, "dot")
+            with open(renderer, "w") as file:
+                file.write(f"#!{sys.executable}\nimport sys\nopen(sys.argv[-1], 'w').write(sys.stdin.read())\n")
+            os.chmod(renderer, os.stat(renderer).st_mode | stat.S_IEXEC)
+            output = os.path.join(workdir, "graph.svg")
+            write_graph(graph, output, "dot", visualizer_path=renderer)
+            with open(output) as file:
+                self.assertEqual(file.read().count("->"), 5)
+        self.assertEqual(read_output_config("config.xml"), (None, False, None, None))
+
 if __name__ == "__main__":
     unittest.main()
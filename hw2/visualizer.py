@@ -1,69 +1,354 @@
+import functools
+import gzip
+import io
 import os
+import random
+import subprocess
 import sys
 import tarfile
-from io import BytesIO
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 from bs4 import BeautifulSoup as Soup
 
 import requests
-from collections import defaultdict
+import urllib3
+from collections import defaultdict, deque
 
-def download_data(base_url, distro, component, arch):
-    url = f"{base_url}/{distro}/{component}/{arch}/APKINDEX.tar.gz"
+from index_cache import IndexCache, TeeReader
+from package_index import PackageIndex
+from writers import GRAPH_WRITERS, iter_edges, write_dot, write_mermaid
+
+RENDER_FORMATS = ("svg", "png", "pdf")  # Форматы, которые рисует Graphviz из DOT
+# Формат вывода по расширению файла, если он не задан в конфигурации
+FORMAT_BY_EXTENSION = {".mmd": "mermaid", ".dot": "dot", ".gv": "dot", ".json": "json"}
+
+def index_url(base_url, distro, component, arch):
+    return f"{base_url}/{distro}/{component}/{arch}/APKINDEX.tar.gz"
+
+@contextmanager
+def open_url(url, session=None):
+    # Поток байт по URL без чтения в память целиком: http(s) через requests (или общую
+    # сессию с пулом соединений), file:// и локальные пути через open (для тестов и бенчмарков без сети)
+    parsed = urlparse(url)
+    if parsed.scheme in ("http", "https"):
+        with (session or requests).get(url, stream=True) as response:
+            response.raise_for_status()
+            yield response.raw
+    else:
+        path = url2pathname(parsed.path) if parsed.scheme == "file" else url
+        with open(path, "rb") as file:
+            yield file
+
+def iter_index_lines(stream):
+    # APKINDEX.tar.gz - несколько gzip-потоков подряд (подпись и сам индекс), поэтому
+    # распаковка через GzipFile, а tar читается последовательно (режим 'r|'):
+    # строки APKINDEX отдаются по мере распаковки, архив не собирается в памяти
+    with gzip.GzipFile(fileobj=stream) as gz, tarfile.open(fileobj=gz, mode="r|", encoding="utf-8") as tar:
+        for member in tar:
+            if member.name == "APKINDEX":
+                yield from tar.extractfile(member)
+                return
+
+def download_data(base_url, distro, component, arch, session=None):
+    # Генератор строк APKINDEX в байтах; загрузка идет параллельно с их разбором
+    url = index_url(base_url, distro, component, arch)
     print(url)
-    #try:
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    with tarfile.open('rb', fileobj=BytesIO(response.content), encoding='utf-8') as f:
-        ff = f.extractfile("APKINDEX")
-        return ff.readlines()
-    #except Exception as e:
-    #    print(f"Ошибка при загрузке {url}: {e}")
-    #    sys.exit(1)
+    with open_url(url, session) as stream:
+        yield from iter_index_lines(stream)
+
+def load_dependencies(base_url, distro, component, arch, cache=None, session=None):
+    # Таблица зависимостей с кэшем: свежий индекс не запрашивается вовсе, иначе идет
+    # условный запрос (If-None-Match/If-Modified-Since); при ответе 304 и для уже разобранного
+    # индекса с той же контрольной суммой разбор пропускается
+    url = index_url(base_url, distro, component, arch)
+    if cache is None or urlparse(url).scheme not in ("http", "https"):
+        return parse_packages(download_data(base_url, distro, component, arch, session))
+
+    meta = cache.load_meta(url)
+    table = None
+    if meta is not None:
+        table = cache.load_parsed(meta["checksum"])
+        if table is None and os.path.exists(cache.raw_path(url)):
+            # Разобранной таблицы нет (например, сменился ее формат) - разбираем сохраненный индекс
+            with open(cache.raw_path(url), "rb") as stream:
+                table = parse_packages(iter_index_lines(stream))
+            cache.save_parsed(meta["checksum"], table)
+        if table is not None and cache.is_fresh(meta):
+            print(f"{url} (кэш)")
+            cache.save_meta(url, meta)
+            return table
+
+    headers = {}
+    if table is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    print(url)
+    with (session or requests).get(url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            print("Индекс не изменился, используется кэш")
+            meta["fetched_at"] = time.time()
+            cache.save_meta(url, meta)
+            return table
+        response.raise_for_status()
+        # Индекс разбирается потоком и одновременно сохраняется в кэш
+        writer = cache.open_raw(url)
+        try:
+            stream = TeeReader(response.raw, writer)
+            table = parse_packages(iter_index_lines(stream))
+            stream.drain()
+        except BaseException:
+            writer.discard()
+            raise
+        with cache.lock:  # Очистка кэша из другого потока не должна застать таблицу без метаданных
+            checksum = cache.commit_raw(url, writer)
+            cache.save_parsed(checksum, table)
+            cache.save_meta(url, {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+                "checksum": checksum,
+            })
+    cache.evict()
+    return table
 
 def parse_packages(packages_data):
-    dependencies = defaultdict(list)
+    # Один проход по строкам APKINDEX: зависимости (D:), предоставляемые виртуальные
+    # имена (p:) и приоритет провайдера (k:) каждого пакета
+    index = PackageIndex()
     current_package = None
 
     for line in packages_data:
         line = line.strip().decode("utf8")
         if line.startswith("P:"):
             current_package = line.split(":", 1)[1].strip()
+            index.add_package(current_package)
         elif line.startswith("D:") and current_package:
-            dep_line = line.split(":", 1)[1].strip()
-            deps = []
-            for dep in dep_line.split():
-                if dep.startswith("so:"):
-                    deps.append(dep.split(":")[1].split(".")[0])
-                else:
-                    deps.append(dep)
-            dependencies[current_package].extend(deps)
+            index.add_dependencies(current_package, line[2:])
+        elif line.startswith("p:") and current_package:
+            index.add_provides(current_package, line[2:])
+        elif line.startswith("k:") and current_package:
+            index.priorities[current_package] = int(line[2:])
         elif not line:  # Пустая строка — конец блока текущего пакета
             current_package = None
-    return dependencies
+    return index
 
-def build_dependency_graph(package_name, dependencies, max_depth):
-    #Построение графа зависимостей до указанной глубины.
+def build_dependency_graph(package_name, dependencies, max_depth=None):
+    # Построение графа зависимостей до указанной глубины обходом в ширину из всех корней сразу.
+    # package_name - имя пакета или список корней, max_depth None - без ограничения.
+    # Глубина пакета - длина кратчайшего пути от ближайшего корня; ребра раскрываются
+    # у пакетов с глубиной не больше max_depth.
+    roots = [package_name] if isinstance(package_name, str) else list(package_name)
     graph = defaultdict(list)
-    visited = set()
+    depth = dict.fromkeys(roots, 0)
+    queue = deque(depth)
+    while queue:
+        pkg = queue.popleft()
+        if max_depth is not None and depth[pkg] > max_depth:
+            continue
+        deps = dependencies.get(pkg, [])
+        if deps:
+            graph[pkg].extend(deps)
+        for dep in deps:
+            if dep not in depth:
+                depth[dep] = depth[pkg] + 1
+                queue.append(dep)
+    return graph
 
-    def fetch_deps(pkg, depth):
-        if depth > max_depth or pkg in visited:
-            return
-        visited.add(pkg)
-        for dep in dependencies.get(pkg, []):
-            graph[pkg].append(dep)
-            fetch_deps(dep, depth + 1)
+class DependencyGraphBuilder:
+    # Полные (без ограничения глубины) графы для многих корней. Транзитивные замыкания
+    # пакетов считаются итеративным алгоритмом Тарьяна по компонентам сильной связности
+    # и запоминаются, поэтому общие части графов разных корней обходятся один раз.
+    # Замыкание хранится битовой маской (int) по номерам пакетов: объединение масок
+    # дешевле объединения множеств на длинных цепочках.
+    def __init__(self, dependencies):
+        self.dependencies = dependencies
+        self.ids = {}  # Пакет -> номер бита
+        self.names = []
+        self.closures = {}  # Пакет -> маска пакетов, достижимых из него (включая его самого)
 
-    fetch_deps(package_name, 0)
-    return graph
+    def bit(self, package):
+        number = self.ids.get(package)
+        if number is None:
+            number = self.ids[package] = len(self.names)
+            self.names.append(package)
+        return 1 << number
 
-def generate_mermaid_graph(graph):
-    #Генерирует граф в формате Mermaid.
-    mermaid = ["graph TD"]
+    def decode(self, mask):
+        return [self.names[number] for number, bit in enumerate(reversed(bin(mask)[2:])) if bit == "1"]
+
+    def closure(self, package):
+        return frozenset(self.decode(self.closure_mask(package)))
+
+    def closure_mask(self, package):
+        if package in self.closures:
+            return self.closures[package]
+        index = {package: 0}
+        low = {package: 0}
+        stack = [package]
+        on_stack = {package}
+        work = [(package, iter(self.dependencies.get(package, [])))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child in self.closures:
+                    continue  # Компонента уже посчитана (в том числе при прошлых вызовах)
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(self.dependencies.get(child, []))))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    # node - корень компоненты: все компоненты-преемники уже посчитаны
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.append(member)
+                        if member == node:
+                            break
+                    reachable = 0
+                    for member in members:
+                        reachable |= self.bit(member)
+                    for member in members:
+                        for child in self.dependencies.get(member, []):
+                            if child in self.closures:
+                                reachable |= self.closures[child]
+                    for member in members:
+                        self.closures[member] = reachable
+        return self.closures[package]
+
+    def graph(self, roots):
+        # Граф всех пакетов, достижимых из корней
+        graph = defaultdict(list)
+        reachable = 0
+        for root in [roots] if isinstance(roots, str) else roots:
+            reachable |= self.closure_mask(root)
+        for pkg in sorted(self.decode(reachable)):
+            deps = self.dependencies.get(pkg, [])
+            if deps:
+                graph[pkg].extend(deps)
+        return graph
+
+    def graphs(self, roots):
+        # Отдельный граф для каждого корня
+        return {root: self.graph(root) for root in roots}
+
+def transitive_reduction(graph):
+    # Убирает ребро pkg -> dep, если dep достижим из pkg и через другую зависимость.
+    # Учитывает циклы: ребра внутри компоненты сильной связности сохраняются, а ребра
+    # между компонентами сокращаются как в ациклическом графе. У пакетов одной компоненты
+    # одинаковая маска замыкания, у разных компонент маски различаются.
+    builder = DependencyGraphBuilder(graph)
+    reduced = defaultdict(list)
     for pkg, deps in graph.items():
+        deps = list(dict.fromkeys(deps))
+        own = builder.closure_mask(pkg)
+        groups = {}  # Маска замыкания (компонента) -> зависимости из нее
         for dep in deps:
-            mermaid.append(f"    {pkg} --> {dep}")
-    return "\n".join(mermaid)
+            mask = builder.closure_mask(dep)
+            if mask != own:
+                groups.setdefault(mask, []).append(dep)
+        masks = list(groups)
+        # Объединение масок всех компонент, кроме i-й, через префиксные и суффиксные суммы
+        prefix = [0]
+        for mask in masks:
+            prefix.append(prefix[-1] | mask)
+        suffix = [0]
+        for mask in reversed(masks):
+            suffix.append(suffix[-1] | mask)
+        suffix.reverse()
+        redundant = set()
+        for number, mask in enumerate(masks):
+            others = prefix[number] | suffix[number + 1]
+            for dep in groups[mask]:
+                if others & builder.bit(dep):
+                    redundant.add(dep)
+        kept = [dep for dep in deps if dep not in redundant]
+        if kept:
+            reduced[pkg].extend(kept)
+    return reduced
+
+def collapse_graph(graph, roots, max_depth=None, max_fan_in=None):
+    # Сворачивание для очень больших графов. Пакеты глубже max_depth (от ближайшего корня)
+    # скрываются, а пакет на границе подписывается числом скрытых под ним пакетов.
+    # У пакетов с числом зависящих больше max_fan_in (musl, busybox и т. п.) входящие ребра
+    # убираются, пакет остается один с подписью о числе зависящих.
+    # Возвращает (граф, подписи узлов).
+    roots = [roots] if isinstance(roots, str) else list(roots)
+    labels = {}
+    if max_depth is not None:
+        # Глубина считается до удаления ребер к большим узлам, иначе они и все, что под ними,
+        # оказываются недостижимыми и не сворачиваются
+        depth = dict.fromkeys(roots, 0)
+        queue = deque(roots)
+        while queue:
+            pkg = queue.popleft()
+            for dep in graph.get(pkg, []):
+                if dep not in depth:
+                    depth[dep] = depth[pkg] + 1
+                    queue.append(dep)
+    if max_fan_in is not None:
+        fan_in = defaultdict(int)
+        for pkg, dep in iter_edges(graph):
+            fan_in[dep] += 1
+        hubs = {dep for dep, count in fan_in.items() if count > max_fan_in and dep not in roots}
+        graph = {pkg: [dep for dep in deps if dep not in hubs] for pkg, deps in graph.items()}
+        for hub in hubs:
+            labels[hub] = f"{hub} ({fan_in[hub]} dependents)"
+    if max_depth is not None:
+        builder = DependencyGraphBuilder(graph)
+        hidden = 0
+        for pkg, value in depth.items():
+            if value > max_depth:
+                hidden |= builder.bit(pkg)
+        collapsed = defaultdict(list)
+        for pkg, deps in graph.items():
+            if depth.get(pkg, max_depth + 1) > max_depth:
+                continue
+            visible = [dep for dep in deps if depth.get(dep, max_depth + 1) <= max_depth]
+            if len(visible) < len(deps):
+                count = bin(builder.closure_mask(pkg) & hidden).count("1")
+                labels[pkg] = f"{labels.get(pkg, pkg)} (+{count})"
+            if visible:
+                collapsed[pkg].extend(visible)
+        labels = {name: label for name, label in labels.items() if depth.get(name, max_depth + 1) <= max_depth}
+        graph = collapsed
+    return graph, labels
+
+def write_graph(graph, output_file, output_format, labels=None, visualizer_path=None):
+    # Граф пишется в файл потоково выбранным писателем; для .svg/.png/.pdf DOT передается
+    # в Graphviz (visualizer_path) через канал без промежуточного файла
+    extension = os.path.splitext(output_file)[1].lstrip(".").lower()
+    if extension in RENDER_FORMATS:
+        with subprocess.Popen([visualizer_path, f"-T{extension}", "-o", output_file],
+                              stdin=subprocess.PIPE, text=True, encoding="utf-8") as process:
+            write_dot(graph, process.stdin, labels)
+            process.stdin.close()
+        if process.returncode:
+            raise RuntimeError(f"{visualizer_path} завершился с кодом {process.returncode}")
+        return
+    with open(output_file, 'w', encoding='utf-8') as file:
+        GRAPH_WRITERS[output_format](graph, file, labels)
+
+def generate_mermaid_graph(graph):
+    #Генерирует граф в формате Mermaid.
+    buffer = io.StringIO()
+    write_mermaid(graph, buffer)
+    return buffer.getvalue().rstrip("\n")
 
 def read_config(config_path):
     with open(config_path, 'r', encoding='utf-8') as file:
@@ -75,12 +360,104 @@ def read_config(config_path):
         base_url = sp.find("base_url").text
         max_depth = sp.find("max_depth").text
         return visualizer_path, package_name, output_file, base_url, int(max_depth)
+
+def read_cache_config(config_path):
+    # Настройки кэша APKINDEX из секции <cache> или None, если кэш не настроен или выключен
+    with open(config_path, 'r', encoding='utf-8') as file:
+        soup = Soup(file.read(), features="xml")
+        cache = soup.find("root").find("cache")
+        if cache is None or (cache.find("enabled") and cache.find("enabled").text.strip() == "false"):
+            return None
+
+        def value(name, default):
+            tag = cache.find(name)
+            return tag.text.strip() if tag is not None and tag.text.strip() else default
+
+        return (value("directory", ".apkcache"), int(value("max_age", 3600)),
+                int(value("max_entries", 16)), int(value("evict_after", 30 * 24 * 3600)))
+
+def read_output_config(config_path):
+    # Формат вывода и упрощение графа из секции <output>: (формат или None - по расширению
+    # output_file, транзитивное сокращение, глубина сворачивания, порог числа зависящих)
+    with open(config_path, 'r', encoding='utf-8') as file:
+        soup = Soup(file.read(), features="xml")
+        output = soup.find("root").find("output")
+
+        def value(name):
+            tag = output.find(name) if output is not None else None
+            return tag.text.strip() if tag is not None and tag.text.strip() else None
+
+        collapse_depth, max_fan_in = value("collapse_depth"), value("max_fan_in")
+        return (value("format"), value("transitive_reduction") == "true",
+                int(collapse_depth) if collapse_depth else None, int(max_fan_in) if max_fan_in else None)
+
+def read_repositories(config_path):
+    # Список (дистрибутив, репозиторий, архитектура) из секции <repositories>;
+    # по умолчанию edge/main/x86_64
+    with open(config_path, 'r', encoding='utf-8') as file:
+        soup = Soup(file.read(), features="xml")
+        section = soup.find("root").find("repositories")
+        repositories = []
+        if section is not None:
+            for repo in section.find_all("repository"):
+                repositories.append((repo.get("distro", "edge"), repo.get("component", "main"),
+                                     repo.get("arch", "x86_64")))
+        return repositories or [("edge", "main", "x86_64")]
+
+def read_fetch_config(config_path):
+    # Параметры загрузки индексов из секции <fetch>: число потоков, повторов и базовая задержка
+    with open(config_path, 'r', encoding='utf-8') as file:
+        soup = Soup(file.read(), features="xml")
+        fetch = soup.find("root").find("fetch")
+
+        def value(name, default):
+            tag = fetch.find(name) if fetch is not None else None
+            return tag.text.strip() if tag is not None and tag.text.strip() else default
+
+        return int(value("workers", 4)), int(value("retries", 3)), float(value("backoff", 0.5))
+
+def with_retries(func, retries=3, backoff=0.5):
+    # Повтор при сетевых ошибках, ответах 5xx и 429 с экспоненциальной задержкой и случайным
+    # разбросом, чтобы параллельные загрузки не повторялись одновременно. Тело индекса читается
+    # из response.raw, поэтому обрыв посреди загрузки приходит ошибкой urllib3 или сброса соединения
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except (requests.RequestException, urllib3.exceptions.HTTPError, ConnectionError) as e:
+            response = getattr(e, "response", None)
+            status = response.status_code if response is not None else None
+            if attempt == retries or (status is not None and status < 500 and status != 429):
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            print(f"Ошибка загрузки ({e}), повтор через {delay:.1f} с")
+            time.sleep(delay)
+
+def make_session(pool_size):
+    # Общая сессия: соединения с зеркалом переиспользуются (keep-alive) всеми потоками
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def load_repositories(base_url, repositories, cache=None, workers=4, retries=3, backoff=0.5):
+    # Общая таблица зависимостей нескольких репозиториев: индексы загружаются и разбираются
+    # параллельно (не больше workers одновременно) через общую сессию, а объединяются
+    # в порядке конфигурации, чтобы приоритет репозиториев не зависел от порядка загрузки
+    with make_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(with_retries, functools.partial(load_dependencies, base_url, distro, component, arch,
+                                                            cache, session), retries, backoff)
+            for distro, component, arch in repositories
+        ]
+        index = PackageIndex()
+        for future in futures:
+            index.merge(future.result())
+    return index
+
 def main():
     # Настройки
     config_path = r"config.xml"
-    distro = "edge"
-    component = "main"
-    arch = "x86_64"
 
     # Проверка конфигурации
     if not os.path.exists(config_path):
@@ -92,28 +469,41 @@ def main():
     visualizer_path, package_name, output_file, base_url, max_depth = read_config(config_path)
 
     max_depth = int(max_depth)
+    roots = package_name.replace(",", " ").split()  # Можно указать несколько корневых пакетов
+    repositories = read_repositories(config_path)
+    workers, retries, backoff = read_fetch_config(config_path)
+    cache_config = read_cache_config(config_path)
+    cache = IndexCache(*cache_config) if cache_config else None
 
-    print("Загрузка APKINDEX...")
-    packages_data = download_data(base_url, distro, component, arch)
-    print("Парсинг APKINDEX...")
-    dependencies = parse_packages(packages_data)
+    print("Загрузка и парсинг APKINDEX...")
+    dependencies = load_repositories(base_url, repositories, cache, workers, retries, backoff)
 
-    # Построение графа зависимостей
+    # Построение графа зависимостей; отрицательная глубина - полный граф
     print("Построение графа зависимостей...")
-    graph = build_dependency_graph(package_name, dependencies, max_depth)
+    if max_depth < 0:
+        graph = DependencyGraphBuilder(dependencies).graph(roots)
+    else:
+        graph = build_dependency_graph(roots, dependencies, max_depth)
 
-    # Генерация Mermaid-графа
-    print("Генерация Mermaid-графа...")
-    mermaid_graph = generate_mermaid_graph(graph)
+    # Упрощение больших графов
+    output_format, reduce, collapse_depth, max_fan_in = read_output_config(config_path)
+    labels = None
+    if reduce:
+        print("Транзитивное сокращение графа...")
+        graph = transitive_reduction(graph)
+    if collapse_depth is not None or max_fan_in is not None:
+        graph, labels = collapse_graph(graph, roots, collapse_depth, max_fan_in)
 
     # Запись в файл
     if output_file:
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(mermaid_graph)
+        extension = os.path.splitext(output_file)[1].lower()
+        output_format = output_format or FORMAT_BY_EXTENSION.get(extension, "mermaid")
+        print(f"Запись графа ({output_format})...")
+        write_graph(graph, output_file, output_format, labels, visualizer_path)
         print(f"Граф зависимостей записан в файл {output_file}.")
     else:
         print("Граф зависимостей:")
-        print(mermaid_graph)
+        GRAPH_WRITERS[output_format or "mermaid"](graph, sys.stdout, labels)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,72 @@
+import json
+import re
+
+# Имена, которые Mermaid принимает как идентификатор узла без экранирования; "end" - ключевое
+# слово, а n<номер> зарезервированы под идентификаторы остальных имен
+MERMAID_ID = re.compile(r"(?!end$|n\d+$)[A-Za-z0-9_]+")
+
+
+def iter_edges(graph):
+    # Ребра графа без повторов: у пакета могут совпадать зависимости (например,
+    # несколько so:-библиотек одного провайдера), в выводе каждое ребро одно
+    for pkg, deps in graph.items():
+        for dep in dict.fromkeys(deps):
+            yield pkg, dep
+
+
+def write_mermaid(graph, file, labels=None):
+    # Mermaid пишется построчно; имена с символами вроде ':', '/', '-' заменяются
+    # идентификаторами n<номер> с исходным именем в подписи
+    labels = labels or {}
+    ids = {}
+
+    def node(name):
+        if name in ids:
+            return ids[name]
+        label = labels.get(name)
+        if label is None and MERMAID_ID.fullmatch(name):
+            ids[name] = name
+            return name
+        ids[name] = f"n{len(ids)}"
+        text = (label or name).replace('"', "#quot;")
+        return f'{ids[name]}["{text}"]'
+
+    file.write("graph TD\n")
+    for name in labels:
+        if name not in ids:
+            file.write(f"    {node(name)}\n")
+    for pkg, dep in iter_edges(graph):
+        file.write(f"    {node(pkg)} --> {node(dep)}\n")
+
+
+def dot_quote(name):
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def write_dot(graph, file, labels=None):
+    # Graphviz DOT, пригодный для dot -Tsvg
+    file.write("digraph dependencies {\n")
+    for name, label in (labels or {}).items():
+        file.write(f"    {dot_quote(name)} [label={dot_quote(label)}];\n")
+    for pkg, dep in iter_edges(graph):
+        file.write(f"    {dot_quote(pkg)} -> {dot_quote(dep)};\n")
+    file.write("}\n")
+
+
+def write_json(graph, file, labels=None):
+    # Список смежности {"пакет": ["зависимость", ...]}, узел за узлом без сборки всего документа;
+    # подписи свернутых узлов - в отдельном ключе "labels" верхнего уровня
+    file.write('{"graph": {')
+    for number, (pkg, deps) in enumerate(graph.items()):
+        separator = "," if number else ""
+        file.write(f"{separator}\n  {json.dumps(pkg)}: {json.dumps(list(dict.fromkeys(deps)))}")
+    file.write('\n}, "labels": ')
+    json.dump(labels or {}, file)
+    file.write("}\n")
+
+
+GRAPH_WRITERS = {
+    "mermaid": write_mermaid,
+    "dot": write_dot,
+    "json": write_json,
+}
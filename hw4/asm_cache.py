@@ -0,0 +1,71 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+CACHE_VERSION = 1
+
+
+class AssemblyCache:
+    # Кэш закодированных команд на диске. Ключ - хэш нормализованной строки исходника
+    # (без комментариев и лишних пробелов), значение - (команда, операнды, байт-код).
+    # При сохранении остаются только записи, использованные в последней сборке.
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as file:
+                data = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return
+        # Кэш другой версии или поврежденный кэш просто пересобирается
+        if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+            self.entries = data["entries"]
+
+    def get(self, text):
+        key = self.key(text)
+        entry = self.used.get(key)
+        if entry is None:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return key, None
+            self.used[key] = entry
+        self.hits += 1
+        return key, entry
+
+    def put(self, key, entry):
+        self.used[key] = entry
+
+    def save(self):
+        # Атомарная запись: временный файл рядом с кэшем и переименование
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".asmcache-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump({"version": CACHE_VERSION, "entries": self.used}, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.entries = self.used
+        self.used = {}
+
+    def report(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.used) or len(self.entries),
+            "hit_rate": self.hits / total if total else None,
+        }
@@ -1,12 +1,38 @@
 import argparse
+import os
+import shutil
 import struct
-import yaml
+import tempfile
+
+from asm_cache import AssemblyCache
+from tracer import Tracer, add_trace_arguments, tracer_from_args
+
+# Поля записи трассировки: номер строки исходника, команда, операнды, закодированные байты
+TRACE_FIELDS = ("line", "command", "operands", "encoded")
+
+# Таблица кодирования: разрядность B, сообщение об ошибке диапазона B и раскладка
+# B по байтам после первого в виде (маска, сдвиг вправо). Первый байт всегда
+# содержит младшие 4 бита B в старшей тетраде и опкод в младшей.
+ENCODINGS = {
+    "LOAD": (19, "Константа B должна быть в диапазоне [0, {}]", ((0xFF0, 4), (0x7F000, 12))),  # 3 байта
+    "READ": (15, "Смещение B должно быть в диапазоне [0, {}]", ((0xFF0, 4), (0x7000, 8))),     # 3 байта
+    "WRITE": (24, "Адрес должен быть в диапазоне [0, {}]",
+              ((0xFF0, 4), (0xFF000, 12), (0xF00000, 16))),                                   # 4 байта
+    "REV": (24, "Адрес должен быть в диапазоне [0, {}]",
+            ((0xFF0, 4), (0xFF000, 12), (0xF00000, 16))),                                     # 4 байта
+}
+
+CHUNK_SIZE = 1 << 16  # Размер буфера байт-кода, после которого он сбрасывается в файл
+
 
 class Assembler:
-    def __init__(self, input_file, output_file, log_file):
+    def __init__(self, input_file, output_file, log_file, tracer=None, chunk_size=CHUNK_SIZE, cache=None):
         self.input_file = input_file
         self.output_file = output_file
         self.log_file = log_file
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.chunk_size = chunk_size
+        self.cache = cache
         self.opcodes = {
             "LOAD": 6,    # Загрузка константы (3 байта)
             "READ": 3,    # Чтение значения из памяти (3 байта)
@@ -14,146 +40,146 @@ class Assembler:
             "REV": 13,     # bitreverse (4 байта)
         }
 
-    def assemble(self):
-        binary_data = []
-        log_entries = {}
-
-        # Считываем текстовый файл с программой
-        with open(self.input_file, 'r') as file:
-            lines = file.readlines()
-
-        for line in lines:
-            line = line.strip()
-
-            # Пропускаем пустые строки и комментарии
-            if not line or line.startswith('#'):
-                continue
-
-            # Удаляем комментарии в конце строки
-            if '#' in line:
-                line = line[:line.index('#')].strip()
-
-            # Разделяем команду и операнды
-            parts = line.split()
-            if len(parts) < 2:
-                raise ValueError(f"Неправильный формат команды: {line}")
-
-            command = parts[0].upper()
-            operands = list(map(int, parts[1:]))
-
-            # Проверяем, существует ли команда в таблице опкодов
-            if command not in self.opcodes:
-                raise ValueError(f"Неизвестная команда: {command}")
-
-            opcode = self.opcodes[command]
-
-            # Пакуем данные в бинарный формат
-            if command == "LOAD":  # A=6, B - константа (19 бит)
-                if len(operands) != 2:
-                    raise ValueError(f"Команда LOAD ожидает 2 операнда")
-                if not (0 <= operands[1] < 2**19):  # B: 19 бит для константы
-                    raise ValueError(f"Константа B должна быть в диапазоне [0, {2**19-1}]")
-                
-                first_byte = (operands[1] & 0xF) << 4 | 0x6
-                
-                b_high = ((operands[1] & 0xF0) | (operands[1] & 0xF00)) >> 4
-                b_low = ((operands[1] & 0xF000) | (operands[1] & 0x70000)) >> 12
-                
-                packed_data = bytes([
-                    first_byte,
-                    b_high,          # старшие биты B
-                    b_low,           # младшие биты B
-                ])
-
-            elif command == "READ":  # A=3, B - смещение (15 бит)
-                if len(operands) != 2:
-                    raise ValueError(f"Команда READ ожидает 2 операнда")
-                if not (0 <= operands[1] < 2**15):  # B: 15 бит для смещения
-                    raise ValueError(f"Смещение B должно быть в диапазоне [0, {2**15-1}]")
-
-                first_byte = (operands[1] & 0xF) << 4 | 0x3
-
-                b_high = ((operands[1] & 0xF0) | (operands[1] & 0xF00)) >> 4
-                b_low = (operands[1] & 0x7000) >> 8
-
-                packed_data = bytes([
-                    first_byte,
-                    b_high,          # старшие биты B
-                    b_low,           # младшие биты B
-                ])
-
-            elif command == "WRITE":  # A=0, B - адрес (24 бита)
-                if len(operands) != 2:
-                    raise ValueError(f"Команда WRITE ожидает 2 операнда")
-                if not (0 <= operands[1] < 2**24):
-                    raise ValueError(f"Адрес должен быть в диапазоне [0, {2**23-1}]")
-
-                first_byte = (operands[1] & 0xF) << 4 | 0x0
-
-                b_high = ((operands[1] & 0xF0) | (operands[1] & 0xF00)) >> 4
-                b_mid = ((operands[1] & 0xF000) | (operands[1] & 0xF0000)) >> 12
-                b_low = (operands[1] & 0xF00000) >> 16
-
-                packed_data = bytes([
-                    first_byte,
-                    b_high,  # старшие биты B
-                    b_mid,  # средние биты B
-                    b_low,  # младшие биты B
-                ])
-
-
-            elif command == "REV":  # A=0, B - адрес (24 бита)
-
-                if len(operands) != 2:
-                    raise ValueError(f"Команда REV ожидает 2 операнда")
-                if not (0 <= operands[1] < 2 ** 24):
-                    raise ValueError(f"Адрес должен быть в диапазоне [0, {2 ** 23 - 1}]")
-
-                first_byte = (operands[1] & 0xF) << 4 | 0xD
-
-                b_high = ((operands[1] & 0xF0) | (operands[1] & 0xF00)) >> 4
-                b_mid = ((operands[1] & 0xF000) | (operands[1] & 0xF0000)) >> 12
-                b_low = (operands[1] & 0xF00000) >> 16
-
-                packed_data = bytes([
-
-                    first_byte,
-
-                    b_high,  # старшие биты B
-                    b_mid,  # средние биты B
-                    b_low,  # младшие биты B
-
-                ])
+    def normalize_line(self, line):
+        # Строка без комментариев и лишних пробелов или None для пустых строк и комментариев
+        line = line.strip()
+
+        # Пропускаем пустые строки и комментарии
+        if not line or line.startswith('#'):
+            return None
+
+        # Удаляем комментарии в конце строки
+        if '#' in line:
+            line = line[:line.index('#')].strip()
+
+        return " ".join(line.split())
+
+    def parse_line(self, line):
+        # Возвращает (команда, операнды) или None для пустых строк и комментариев
+        line = self.normalize_line(line)
+        if line is None:
+            return None
+
+        # Разделяем команду и операнды
+        parts = line.split()
+        if len(parts) < 2:
+            raise ValueError(f"Неправильный формат команды: {line}")
+
+        command = parts[0].upper()
+        operands = list(map(int, parts[1:]))
+
+        # Проверяем, существует ли команда в таблице опкодов
+        if command not in self.opcodes:
+            raise ValueError(f"Неизвестная команда: {command}")
+        if command not in ENCODINGS:
+            raise ValueError(f"Команда {command} не поддерживается: {line}")
+        return command, operands
+
+    def encode(self, command, operands):
+        bits, range_error, layout = ENCODINGS[command]
+        if len(operands) != 2:
+            raise ValueError(f"Команда {command} ожидает 2 операнда")
+        B = operands[1]
+        if not (0 <= B < 2**bits):
+            raise ValueError(range_error.format(2**bits - 1))
+
+        packed_data = bytearray(1 + len(layout))
+        packed_data[0] = (B & 0xF) << 4 | self.opcodes[command]
+        for index, (mask, shift) in enumerate(layout, 1):
+            packed_data[index] = (B & mask) >> shift
+        return packed_data
 
+    def assemble(self):
+        # Однопроходная потоковая сборка: байт-код копится в bytearray и сбрасывается
+        # кусками во временный файл рядом с output_file, который подменяет его только
+        # после успешной сборки; записи лога складываются во временные файлы по командам
+        tracer = self.tracer
+        if tracer.enabled:
+            tracer.start(TRACE_FIELDS)
+        cache = self.cache
+        spools = {}
+        output_dir = os.path.dirname(os.path.abspath(self.output_file))
+        fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-", suffix=".bin")
+        try:
+            with os.fdopen(fd, 'wb') as bin_file, open(self.input_file, 'r') as source:
+                buffer = bytearray()
+                for line_number, line in enumerate(source, 1):
+                    text = self.normalize_line(line)
+                    if text is None:
+                        continue
+                    if cache is None:
+                        command, operands = self.parse_line(text)
+                        packed_data = self.encode(command, operands)
+                    else:
+                        # Повторно кодируются только строки, которых нет в кэше
+                        key, entry = cache.get(text)
+                        if entry is None:
+                            command, operands = self.parse_line(text)
+                            entry = (command, operands, bytes(self.encode(command, operands)))
+                            cache.put(key, entry)
+                        command, operands, packed_data = entry
+
+                    buffer += packed_data
+                    if len(buffer) >= self.chunk_size:
+                        bin_file.write(buffer)
+                        buffer.clear()
+
+                    if command not in spools:
+                        spools[command] = tempfile.TemporaryFile('w+')
+                    spools[command].write(f"{command} {operands}\n")
+
+                    if tracer.enabled:
+                        tracer.record(line_number, command, " ".join(map(str, operands)), packed_data.hex())
+                bin_file.write(buffer)
+            if os.path.exists(self.output_file):
+                shutil.copymode(self.output_file, temp_path)
             else:
-                raise ValueError(f"Команда {command} не поддерживается: {line}")
-
-            binary_data.append(packed_data)
-            if command not in log_entries.keys():
-                log_entries[command] = []
-            log_entries[command].append(f"{command} {operands}")
-
-            # Отладочный вывод
-            print(f"Обработана команда: {command} {operands} {packed_data}")
-
-        # Записываем бинарные данные в выходной файл
-        with open(self.output_file, 'wb') as bin_file:
-            for entry in binary_data:
-                bin_file.write(entry)
-
-        # Создаем лог-файл в формате CSV
+                os.chmod(temp_path, 0o644)  # mkstemp создает файл с правами 0600
+            os.replace(temp_path, self.output_file)
+        except Exception:
+            for spool in spools.values():
+                spool.close()
+            os.remove(temp_path)  # Прежний байт-код остается нетронутым
+            raise
+
+        self.write_log(spools)
+        tracer.flush()
+        if cache is not None:
+            cache.save()
+
+    def write_log(self, spools):
+        # Лог в том же виде, что и yaml.dump({команда: [записи]}): ключи по алфавиту
         with open(self.log_file, 'w') as log_file:
-            yaml.dump(log_entries, log_file)
-
-        print(f"Сборка завершена. Бинарный файл: {self.output_file}, Лог-файл: {self.log_file}")
+            if not spools:
+                log_file.write("{}\n")
+            for command in sorted(spools):
+                spool = spools[command]
+                spool.seek(0)
+                log_file.write(f"{command}:\n")
+                for entry in spool:
+                    log_file.write(f"- {entry}")
+                spool.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Assembler for the educational virtual machine.")
     parser.add_argument('-i', '--input', required=True, help="Path to the input assembly file.")
     parser.add_argument('-o', '--output', required=True, help="Path to the output binary file.")
     parser.add_argument('-l', '--log', required=True, help="Path to the log file.")
+    parser.add_argument('--cache', nargs='?', const='', default=None,
+                        help="Use an on-disk cache of encoded lines (default path: <input>.asmcache).")
+    parser.add_argument('--cache-report', action='store_true', help="Print cache hit/miss statistics.")
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
 
-    assembler = Assembler(args.input, args.output, args.log)
-    assembler.assemble()
+    cache = None
+    if args.cache is not None:
+        cache = AssemblyCache(args.cache or args.input + ".asmcache")
+
+    with tracer_from_args(args) as tracer:
+        assembler = Assembler(args.input, args.output, args.log, tracer, cache=cache)
+        assembler.assemble()
+    print(f"Сборка завершена. Бинарный файл: {args.output}, Лог-файл: {args.log}")
+    if cache is not None and args.cache_report:
+        report = cache.report()
+        print(f"Кэш: попаданий {report['hits']}, промахов {report['misses']}, записей {report['entries']}")
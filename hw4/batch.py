@@ -0,0 +1,85 @@
+import argparse
+
+import numpy as np
+
+from interpreter import LOAD, READ, REV, WRITE, decode_program
+from memory import MAX_MEMORY_SIZE, WORD_SIZES
+
+WORD_DTYPES = {1: np.uint8, 2: np.uint16, 4: np.uint32, 8: np.uint64}
+
+
+class BatchInterpreter:
+    # Выполняет одну программу сразу для N независимых состояний машины.
+    # В УВМ нет ветвлений, поэтому все экземпляры идут по одной и той же
+    # последовательности команд: аккумуляторы - вектор длины N, память - матрица N x размер.
+    def __init__(self, binary_file, memories, word_size=4):
+        if word_size not in WORD_SIZES:
+            raise ValueError(f"Размер слова должен быть одним из {WORD_SIZES}")
+        memories = np.array(memories, dtype=WORD_DTYPES[word_size])
+        if memories.ndim != 2:
+            raise ValueError("Начальные образы памяти должны быть матрицей N x размер памяти")
+        if not (0 < memories.shape[1] <= MAX_MEMORY_SIZE):
+            raise ValueError(f"Размер памяти должен быть в диапазоне [1, {MAX_MEMORY_SIZE}]")
+        self.binary_file = binary_file
+        self.memory = memories
+        self.mask = (1 << (8 * word_size)) - 1
+        self.acc = np.zeros(len(memories), dtype=np.uint64)
+        self.opcodes = None
+        self.operands = None
+
+    def load_program(self):
+        with open(self.binary_file, "rb") as file:
+            program = file.read()
+        self.opcodes, self.operands = decode_program(program, self.memory.shape[1])
+
+    def run(self):
+        memory = self.memory
+        size = memory.shape[1]
+        rows = np.arange(len(memory))
+        mask = self.mask
+        # Пока аккумулятор одинаков у всех экземпляров (после LOAD), он хранится скаляром
+        acc = None
+        vector = self.acc
+        for opcode, B in zip(self.opcodes, self.operands):
+            if opcode == LOAD:
+                acc = B
+            elif opcode == READ:
+                if acc is not None:
+                    addr = acc + B
+                    if addr >= size:
+                        raise ValueError(f"Адрес {addr} выходит за пределы памяти при выполнении READ computed")
+                    vector = memory[:, addr].astype(np.uint64)
+                else:
+                    addr = vector + np.uint64(B)
+                    if len(addr) and int(addr.max()) >= size:
+                        raise ValueError(f"Адрес {int(addr.max())} выходит за пределы памяти при выполнении READ computed")
+                    vector = memory[rows, addr].astype(np.uint64)
+                acc = None
+            elif opcode == WRITE:
+                memory[:, B] = (acc & mask) if acc is not None else vector & np.uint64(mask)
+            elif opcode == REV:
+                memory[:, B] = ((acc ^ 255) & mask) if acc is not None else (vector ^ np.uint64(255)) & np.uint64(mask)
+        self.acc = np.full(len(memory), acc, dtype=np.uint64) if acc is not None else vector
+        return memory
+
+    def results(self, start, end):
+        # Диапазон памяти всех экземпляров: матрица N x (end - start + 1) без копирования
+        if not (0 <= start <= end < self.memory.shape[1]):
+            raise ValueError(f"Диапазон {start}-{end} выходит за пределы памяти")
+        return self.memory[:, start:end + 1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетное выполнение программы УВМ для многих начальных состояний.")
+    parser.add_argument("-i", "--input", required=True, help="Путь к бинарному файлу")
+    parser.add_argument("-m", "--memories", required=True,
+                        help="Файл .npy с начальными образами памяти (матрица N x размер памяти)")
+    parser.add_argument("-r", "--result", required=True, help="Путь к .npy-файлу результата (N x диапазон)")
+    parser.add_argument("--range", required=True, type=int, nargs=2, help="Диапазон памяти (start end)")
+    parser.add_argument("--word-size", type=int, choices=WORD_SIZES, default=4, help="Размер слова памяти в байтах")
+
+    args = parser.parse_args()
+    interpreter = BatchInterpreter(args.input, np.load(args.memories), args.word_size)
+    interpreter.load_program()
+    interpreter.run()
+    np.save(args.result, interpreter.results(*args.range))
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+from assembler import Assembler
+from interpreter import Interpreter
+
+COMMANDS = ("LOAD", "READ", "WRITE", "REV")
+DEFAULT_MIX = {"LOAD": 4, "READ": 2, "WRITE": 3, "REV": 1}
+
+
+def generate_program(path, length, mix=None, memory_size=2048, seed=0):
+    # Синтетическая программа заданной длины с заданными весами команд.
+    # Перед каждым READ аккумулятор сбрасывается LOAD 0, чтобы адрес не вышел за пределы памяти.
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    commands = [command for command in COMMANDS if mix.get(command)]
+    weights = [mix[command] for command in commands]
+    emitted = 0
+    with open(path, "w") as file:
+        while emitted < length:
+            command = rng.choices(commands, weights)[0]
+            if command == "LOAD":
+                file.write(f"LOAD 6 {rng.randrange(2**19)}\n")
+            elif command == "READ":
+                if emitted + 2 > length:
+                    # Пара LOAD 0 + READ не помещается в последнюю позицию - дополняем одним LOAD 0,
+                    # иначе программа только из READ нечетной длины генерировалась бы бесконечно
+                    file.write("LOAD 6 0\n")
+                else:
+                    file.write(f"LOAD 6 0\nREAD 3 {rng.randrange(min(memory_size, 2**15))}\n")
+                    emitted += 1
+            elif command == "WRITE":
+                file.write(f"WRITE 0 {rng.randrange(memory_size)}\n")
+            else:
+                file.write(f"REV 13 {rng.randrange(memory_size)}\n")
+            emitted += 1
+    return emitted
+
+
+def measure(func):
+    # Время выполнения и пиковый прирост памяти (tracemalloc) одного вызова
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        func()
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def timed(func, repeat):
+    # Лучшее время из repeat запусков без накладных расходов tracemalloc
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_stages(workdir, source, length, mode, memory_size, repeat):
+    binary = os.path.join(workdir, "program.bin")
+    log = os.path.join(workdir, "program.yaml")
+    result = os.path.join(workdir, "result.yaml")
+    interpreter = Interpreter(binary, result, (0, 0), mode, memory_size=memory_size)
+
+    def assemble():
+        Assembler(source, binary, log).assemble()
+
+    def execute():
+        # Предекодирование входит в замер, сохранение результата - нет.
+        # Программа без ветвлений, поэтому повторный прогон по той же памяти стоит столько же.
+        interpreter.opcodes = None
+        interpreter.acc = 0
+        interpreter.run()
+
+    stages = {}
+    for name, func in (("assemble", assemble), ("load_program", interpreter.load_program), ("execute", execute)):
+        _, peak = measure(func)
+        seconds = timed(func, repeat)
+        stages[name] = {
+            "seconds": seconds,
+            "instructions_per_second": length / seconds if seconds else None,
+            "peak_memory_bytes": peak,
+        }
+    return stages
+
+
+def run_benchmark(length, mix=None, mode="predecoded", memory_size=2048, repeat=3, seed=0):
+    mix = mix or DEFAULT_MIX
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "program.asm")
+        length = generate_program(source, length, mix, memory_size, seed)
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "length": length,
+            "mix": mix,
+            "mode": mode,
+            "memory_size": memory_size,
+            "repeat": repeat,
+            "stages": run_stages(workdir, source, length, mode, memory_size, repeat),
+            "per_opcode": {},
+        }
+
+        # Стоимость одной команды каждого вида: программа из одной команды.
+        # READ генерируется в паре с LOAD 0, поэтому его стоимость усреднена по паре.
+        for command in COMMANDS:
+            single = os.path.join(workdir, f"{command}.asm")
+            count = generate_program(single, length, {command: 1}, memory_size, seed)
+            stages = run_stages(workdir, single, count, mode, memory_size, repeat)
+            report["per_opcode"][command] = {
+                stage: stages[stage]["seconds"] / count * 1e9 for stage in ("assemble", "execute")
+            }
+            report["per_opcode"][command]["unit"] = "ns/instruction"
+        return report
+
+
+def compare_reports(baseline, current):
+    # Отношение времени текущего прогона к базовому по этапам и командам (>1 - медленнее)
+    ratios = {}
+    for stage, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if base and base["seconds"]:
+            ratios[stage] = stats["seconds"] / base["seconds"]
+    for command, stats in current["per_opcode"].items():
+        base = baseline.get("per_opcode", {}).get(command)
+        if base and base["execute"]:
+            ratios[f"{command}.execute"] = stats["execute"] / base["execute"]
+    return ratios
+
+
+def parse_mix(text):
+    # Формат: LOAD=4,READ=2,WRITE=3,REV=1
+    mix = {}
+    for item in text.split(","):
+        command, _, weight = item.partition("=")
+        command = command.strip().upper()
+        if command not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"Неизвестная команда: {command}")
+        mix[command] = float(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк ассемблера и интерпретатора УВМ.")
+    parser.add_argument("-n", "--length", type=int, default=100000, help="Количество команд в программе")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Веса команд, например LOAD=4,READ=2,WRITE=3,REV=1")
+    parser.add_argument("--mode", choices=("predecoded", "reference"), default="predecoded",
+                        help="Режим выполнения интерпретатора")
+    parser.add_argument("--memory-size", type=int, default=2048, help="Размер памяти в словах")
+    parser.add_argument("--repeat", type=int, default=3, help="Количество повторов каждого замера")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора программ")
+    parser.add_argument("-o", "--output", help="Путь к JSON-файлу с результатами")
+    parser.add_argument("--compare", help="JSON-файл предыдущего прогона для сравнения")
+
+    args = parser.parse_args()
+    report = run_benchmark(args.length, args.mix, args.mode, args.memory_size, args.repeat, args.seed)
+
+    for stage, stats in report["stages"].items():
+        print(f"{stage}: {stats['seconds']:.4f} с, {stats['instructions_per_second']:.0f} команд/с, "
+              f"пик памяти {stats['peak_memory_bytes']} байт")
+    for command, stats in report["per_opcode"].items():
+        print(f"{command}: сборка {stats['assemble']:.0f} нс, выполнение {stats['execute']:.0f} нс на команду")
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        report["comparison"] = compare_reports(baseline, report)
+        for name, ratio in report["comparison"].items():
+            print(f"{name}: {ratio:.2f}x относительно {args.compare}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
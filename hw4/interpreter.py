@@ -1,88 +1,298 @@
 import argparse
-import yaml
+from array import array
 
+from memory import MAX_MEMORY_SIZE, WORD_SIZES, Memory
+from tracer import Tracer, add_trace_arguments, tracer_from_args
+from writers import RESULT_WRITERS
+
+
+MEMORY_SIZE = 2048  # Размер памяти по умолчанию в словах
+
+# Коды операций (младшие 4 бита первого байта команды)
+WRITE = 0x0
+READ = 0x3
+LOAD = 0x6
+REV = 0xD
+
+# Сдвиги, с которыми байты 1..n команды входят в операнд B
+# (младшие 4 бита B лежат в старшей тетраде первого байта).
+# Раскладка повторяет кодирование в assembler.py, длина команды = 1 + len(сдвигов).
+INSTRUCTION_FORMATS = {
+    LOAD: (4, 12),       # 3 байта, B - 19 бит
+    READ: (4, 8),        # 3 байта, B - 15 бит
+    WRITE: (4, 12, 16),  # 4 байта, B - 24 бита
+    REV: (4, 12, 16),    # 4 байта, B - 24 бита
+}
+
+# Внутренние суперкоманды, которые создает optimizer.py (ассемблер их не кодирует).
+# Составные операнды упакованы как (значение или адрес-источник << 24) | адрес-приемник.
+READ_ABS = 0x10    # LOAD c + READ b: acc = mem[c + b]
+LOAD_WRITE = 0x11  # LOAD c + WRITE a: acc = c, mem[a] = c
+LOAD_REV = 0x12    # LOAD c + REV a: acc = c, mem[a] = c ^ 255
+READ_WRITE = 0x13  # READ_ABS s + WRITE a: acc = mem[s], mem[a] = acc
+READ_REV = 0x14    # READ_ABS s + REV a: acc = mem[s], mem[a] = acc ^ 255
+ADDRESS_MASK = 0xFFFFFF
+
+OPCODE_NAMES = {
+    LOAD: "LOAD", READ: "READ", WRITE: "WRITE", REV: "REV",
+    READ_ABS: "READ_ABS", LOAD_WRITE: "LOAD_WRITE", LOAD_REV: "LOAD_REV",
+    READ_WRITE: "READ_WRITE", READ_REV: "READ_REV",
+}
+
+MODES = ("predecoded", "reference")
+RESULT_FORMATS = tuple(RESULT_WRITERS)
+
+# Поля записи трассировки: номер команды, опкод, операнд, аккумулятор до/после, адрес памяти
+TRACE_FIELDS = ("pc", "opcode", "operand", "acc_before", "acc_after", "address")
+
+
+def check_address(addr, memory_size, operation):
+    if not (0 <= addr < memory_size):
+        raise ValueError(f"Адрес {addr} выходит за пределы памяти при выполнении {operation}")
+
+
+def decode_program(program, memory_size=MEMORY_SIZE):
+    # Предварительное декодирование: программа разбирается один раз
+    # в два параллельных массива (опкод, готовый операнд B)
+    opcodes = array("B")
+    operands = array("Q")
+    end = len(program)
+    pointer = 0
+    while pointer < end:
+        first_byte = program[pointer]
+        opcode = first_byte & 0xF
+        shifts = INSTRUCTION_FORMATS.get(opcode)
+        if shifts is None:
+            raise ValueError(f"Неизвестная команда: {hex(first_byte)}")
+        if pointer + len(shifts) >= end:
+            raise ValueError(f"Команда по смещению {pointer} обрезана")
+
+        B = first_byte >> 4
+        for offset, shift in enumerate(shifts, 1):
+            B |= program[pointer + offset] << shift
+
+        # Адреса WRITE/REV и смещение READ известны заранее - проверяем их сразу
+        if opcode == READ:
+            check_address(B, memory_size, "READ source")
+        elif opcode == WRITE:
+            check_address(B, memory_size, "WRITE destination")
+        elif opcode == REV:
+            check_address(B, memory_size, "MIN address")
+
+        opcodes.append(opcode)
+        operands.append(B)
+        pointer += len(shifts) + 1
+    return opcodes, operands
 
-MEMORY_SIZE = 2048  # Размер памяти в байтах
 
 class Interpreter:
-    def __init__(self, binary_file, result_file, memory_range):
+    def __init__(self, binary_file, result_file, memory_range, mode="predecoded", tracer=None,
+                 memory_size=MEMORY_SIZE, word_size=4, memory_file=None, result_format="yaml", optimize=False):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим выполнения: {mode}")
+        if optimize and mode == "reference":
+            raise ValueError("Оптимизация недоступна в эталонном режиме")
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"Неизвестный формат результата: {result_format}")
         self.binary_file = binary_file
         self.result_file = result_file
         self.memory_range = memory_range
-        self.memory = [0] * MEMORY_SIZE
+        self.mode = mode
+        self.optimize = optimize
+        self.optimization = None
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.result_format = result_format
+        self.memory = Memory(memory_size, word_size, memory_file)
+        # Прямой доступ к буферу памяти для горячего цикла
+        self.cells = self.memory.cells
+        self.mask = self.memory.mask
         self.acc = 0
+        self.opcodes = None
+        self.operands = None
         
     def check_address(self, addr, operation):
-        if not (0 <= addr < MEMORY_SIZE):
-            raise ValueError(f"Адрес {addr} выходит за пределы памяти при выполнении {operation}")
+        check_address(addr, self.memory.size, operation)
     
     def load_program(self):
         with open(self.binary_file, "rb") as file:
             self.program = file.read()
+        self.opcodes = None
+        self.operands = None
+
+    def compile(self):
+        self.opcodes, self.operands = decode_program(self.program, self.memory.size)
+        if self.optimize:
+            from optimizer import optimize
+            self.opcodes, self.operands, self.optimization = optimize(self.opcodes, self.operands, self.memory.size)
+
+    def op_load(self, B):
+        self.acc = B
+
+    def op_read(self, B):
+        value = self.acc + B
+        self.check_address(value, "READ computed")
+        self.acc = self.cells[value]
+
+    def op_write(self, B):
+        self.cells[B] = self.acc & self.mask
+
+    def op_rev(self, B):
+        self.cells[B] = (self.acc ^ 255) & self.mask
+
+    def op_read_abs(self, B):
+        self.acc = self.cells[B]
+
+    def op_load_write(self, B):
+        self.acc = B >> 24
+        self.cells[B & ADDRESS_MASK] = self.acc & self.mask
+
+    def op_load_rev(self, B):
+        self.acc = B >> 24
+        self.cells[B & ADDRESS_MASK] = (self.acc ^ 255) & self.mask
+
+    def op_read_write(self, B):
+        self.acc = self.cells[B >> 24]
+        self.cells[B & ADDRESS_MASK] = self.acc & self.mask
+
+    def op_read_rev(self, B):
+        self.acc = self.cells[B >> 24]
+        self.cells[B & ADDRESS_MASK] = (self.acc ^ 255) & self.mask
+
+    def handlers(self):
+        # Таблица обработчиков, индексируемая опкодом
+        table = [None] * 32
+        table[LOAD] = self.op_load
+        table[READ] = self.op_read
+        table[WRITE] = self.op_write
+        table[REV] = self.op_rev
+        table[READ_ABS] = self.op_read_abs
+        table[LOAD_WRITE] = self.op_load_write
+        table[LOAD_REV] = self.op_load_rev
+        table[READ_WRITE] = self.op_read_write
+        table[READ_REV] = self.op_read_rev
+        return table
+
+    def trace(self, pc, opcode, B, acc_before):
+        if opcode == LOAD:
+            address = ""
+        elif opcode == READ:
+            address = acc_before + B
+        elif opcode <= REV or opcode == READ_ABS:
+            address = B
+        else:
+            address = B & ADDRESS_MASK
+        self.tracer.record(pc, OPCODE_NAMES[opcode], B, acc_before, self.acc, address)
 
     def execute(self):
+        self.run()
+        self.save_results()
+
+    def run(self):
+        # Выполнение программы без сохранения результата
+        tracer = self.tracer
+        if tracer.enabled:
+            tracer.start(TRACE_FIELDS)
+        try:
+            if self.mode == "reference":
+                self.execute_reference()
+            else:
+                if self.opcodes is None:
+                    self.compile()
+                handlers = self.handlers()
+                if tracer.enabled:
+                    for pc, (opcode, B) in enumerate(zip(self.opcodes, self.operands)):
+                        acc_before = self.acc
+                        handlers[opcode](B)
+                        self.trace(pc, opcode, B, acc_before)
+                else:
+                    for opcode, B in zip(self.opcodes, self.operands):
+                        handlers[opcode](B)
+        finally:
+            tracer.flush()
+
+    def execute_reference(self):
+        # Эталонный режим: декодирование байт за байтом на каждом шаге
+        tracing = self.tracer.enabled
+        pc = 0
         pointer = 0
         while pointer < len(self.program):
             # Получаем opcode из первого байта
             first_byte = self.program[pointer]
+            acc_before = self.acc
             
             if first_byte & 0xF == 0x06:  # LOAD (3 байта)
                 B = ((self.program[pointer] & 0xF0) >> 4) | (self.program[pointer + 1] << 4) | \
                     (self.program[pointer + 2] << 12)
                 self.acc = B
-                print(f"LOAD: введено значение {B}")
                 pointer += 3
             
             elif first_byte & 0xF == 0x03:  # READ (3 байта)
                 B = ((self.program[pointer] & 0xF0) >> 4) | (self.program[pointer + 1] << 4) | \
-                    (self.program[pointer + 2] << 12)
+                    (self.program[pointer + 2] << 8)
                 self.check_address(B, "READ source")
                 value = self.acc + B
                 self.check_address(value, "READ computed")
-                self.acc = self.memory[value]
-                print(f"READ: прочитано значение {self.acc}")
+                self.acc = self.cells[value]
                 pointer += 3
 
             elif first_byte & 0xF == 0x00:  # WRITE (4 байта)
                 # Декодируем B (адрес) из следующих байтов
                 B = ((self.program[pointer] & 0xF0) >> 4) | (self.program[pointer + 1] << 4) | \
-                    (self.program[pointer + 2] << 12) | (self.program[pointer + 2] << 16)
+                    (self.program[pointer + 2] << 12) | (self.program[pointer + 3] << 16)
                 self.check_address(B, "WRITE destination")
-                self.memory[B] = self.acc
-                print(f"WRITE: записано значение {self.acc}")
+                self.cells[B] = self.acc & self.mask
                 pointer += 4
 
             elif first_byte & 0xF == 0xD:  # REV (4 байтa)
                 # Декодируем B (адрес) из следующих байтов
                 B = ((self.program[pointer] & 0xF0) >> 4) | (self.program[pointer + 1] << 4) | \
-                    (self.program[pointer + 2] << 12) | (self.program[pointer + 2] << 16)
+                    (self.program[pointer + 2] << 12) | (self.program[pointer + 3] << 16)
                 
                 self.check_address(B, "MIN address")
                 
-                result = self.acc ^ 255
-                print(f"REV: значение {self.acc} перевёрнуто в {result}")
-                self.memory[B] = result
+                self.cells[B] = (self.acc ^ 255) & self.mask
                 pointer += 4
 
             else:
                 raise ValueError(f"Неизвестная команда: {hex(first_byte)}")
-        self.save_results()
+
+            if tracing:
+                self.trace(pc, first_byte & 0xF, B, acc_before)
+            pc += 1
 
     def save_results(self):
         start, end = self.memory_range
-        with open(self.result_file, "w", newline="") as file:
-            to_yaml = {}
-            for addr in range(start, end + 1):
-                to_yaml[addr] = self.memory[addr]
-            yaml.dump(to_yaml, file)
+        RESULT_WRITERS[self.result_format](self.memory, self.result_file, start, end)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Интерпретатор УВМ.")
     parser.add_argument("-i", "--input", required=True, help="Путь к бинарному файлу")
     parser.add_argument("-r", "--result", required=True, help="Путь к файлу результата")
     parser.add_argument("--range", required=True, type=int, nargs=2, help="Диапазон памяти (start end)")
+    parser.add_argument("--mode", choices=MODES, default="predecoded",
+                        help="Режим выполнения: predecoded - предварительно декодированный поток команд, "
+                             "reference - эталонное побайтовое декодирование")
+    parser.add_argument("--memory-size", type=int, default=MEMORY_SIZE,
+                        help=f"Размер памяти в словах (не более {MAX_MEMORY_SIZE})")
+    parser.add_argument("--word-size", type=int, choices=WORD_SIZES, default=4, help="Размер слова памяти в байтах")
+    parser.add_argument("--memory-file", help="Файл, отображаемый в память (mmap) вместо буфера в ОЗУ")
+    parser.add_argument("--format", choices=RESULT_FORMATS, default="yaml",
+                        help="Формат результата: yaml, csv, bin (сырой дамп диапазона памяти) или npy")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Удалить мертвые LOAD/WRITE и объединить частые пары команд в суперкоманды")
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
-    interpreter = Interpreter(args.input, args.result, args.range)
-    interpreter.load_program()
-    interpreter.execute()
+    with tracer_from_args(args) as tracer:
+        interpreter = Interpreter(args.input, args.result, args.range, args.mode, tracer,
+                                  args.memory_size, args.word_size, args.memory_file, args.format, args.optimize)
+        try:
+            interpreter.load_program()
+            interpreter.execute()
+        finally:
+            interpreter.memory.close()
+    if interpreter.optimization:
+        report = interpreter.optimization
+        print(f"Оптимизация: {report['original']} -> {report['optimized']} команд, удалено {report['eliminated']} "
+              f"(LOAD {report['eliminated_loads']}, READ {report['eliminated_reads']}, "
+              f"WRITE/REV {report['eliminated_writes']}), объединено пар {report['fused']}")
@@ -0,0 +1,67 @@
+import mmap
+from array import array
+
+
+MAX_MEMORY_SIZE = 1 << 24  # Операнды WRITE/REV адресуют 24 бита
+WORD_SIZES = (1, 2, 4, 8)
+
+
+def word_typecode(word_size):
+    # Подбираем тип элемента array с нужным размером слова
+    for typecode in "BHILQ":
+        if array(typecode).itemsize == word_size:
+            return typecode
+    raise ValueError(f"Неподдерживаемый размер слова: {word_size}")
+
+
+class Memory:
+    # Память УВМ: плотный буфер слов фиксированного размера.
+    # Без backing_file хранится в array, с ним - в отображенном в память файле (mmap).
+    def __init__(self, size, word_size=4, backing_file=None):
+        if not (0 < size <= MAX_MEMORY_SIZE):
+            raise ValueError(f"Размер памяти должен быть в диапазоне [1, {MAX_MEMORY_SIZE}]")
+        if word_size not in WORD_SIZES:
+            raise ValueError(f"Размер слова должен быть одним из {WORD_SIZES}")
+        self.size = size
+        self.word_size = word_size
+        self.mask = (1 << (8 * word_size)) - 1
+        self.typecode = word_typecode(word_size)
+        self.backing_file = backing_file
+        self.map = None
+
+        if backing_file is None:
+            self.cells = array(self.typecode, [0]) * size
+        else:
+            with open(backing_file, "w+b") as file:
+                file.truncate(size * word_size)
+                self.map = mmap.mmap(file.fileno(), size * word_size)
+            self.cells = memoryview(self.map).cast(self.typecode)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, addr):
+        return self.cells[addr]
+
+    def __setitem__(self, addr, value):
+        self.cells[addr] = value & self.mask
+
+    def check_range(self, start, end):
+        if not (0 <= start <= end < self.size):
+            raise ValueError(f"Диапазон {start}-{end} выходит за пределы памяти")
+
+    def view(self, start, end):
+        # Срез памяти [start, end] без копирования
+        self.check_range(start, end)
+        return memoryview(self.cells)[start:end + 1]
+
+    def dump(self, file, start, end):
+        # Запись диапазона памяти в двоичный файл прямо из буфера
+        with self.view(start, end) as view:
+            file.write(view)
+
+    def close(self):
+        if self.map is not None:
+            self.cells.release()
+            self.map.close()
+            self.map = None
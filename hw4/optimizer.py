@@ -0,0 +1,120 @@
+from array import array
+
+from interpreter import LOAD, LOAD_REV, LOAD_WRITE, READ, READ_ABS, READ_REV, READ_WRITE, REV, WRITE
+
+FUSIONS = {
+    (LOAD, WRITE): LOAD_WRITE,
+    (LOAD, REV): LOAD_REV,
+    (READ_ABS, WRITE): READ_WRITE,
+    (READ_ABS, REV): READ_REV,
+}
+
+
+def propagate_constants(program, memory_size):
+    # Прямой проход: отслеживаем известное значение аккумулятора.
+    # Повторный LOAD того же значения удаляется, READ при известном аккумуляторе
+    # превращается в чтение по абсолютному адресу.
+    result = []
+    acc = 0  # Аккумулятор в начале выполнения равен 0
+    removed = 0
+    for opcode, B in program:
+        if opcode == LOAD:
+            if acc == B:
+                removed += 1
+                continue
+            acc = B
+        elif opcode == READ:
+            # Адрес за пределами памяти оставляем как есть - ошибка произойдет при выполнении
+            if acc is not None and acc + B < memory_size:
+                opcode, B = READ_ABS, acc + B
+            acc = None
+        elif opcode == READ_ABS:
+            acc = None
+        result.append((opcode, B))
+    return result, removed
+
+
+def eliminate_dead_code(program):
+    # Обратный проход: удаляет LOAD/READ_ABS, значение которых не используется,
+    # и WRITE/REV в адреса, которые перезаписываются раньше, чем читаются.
+    # Итоговое значение аккумулятора не сохраняется, важна только память.
+    result = []
+    acc_live = False
+    overwritten = set()
+    stats = {"loads": 0, "reads": 0, "writes": 0}
+    for opcode, B in reversed(program):
+        if opcode == LOAD:
+            if not acc_live:
+                stats["loads"] += 1
+                continue
+            acc_live = False
+        elif opcode == READ_ABS:
+            if not acc_live:
+                stats["reads"] += 1
+                continue
+            acc_live = False
+            overwritten.discard(B)
+        elif opcode == READ:
+            # Адрес зависит от данных: чтение может затронуть любую ячейку
+            acc_live = True
+            overwritten.clear()
+        else:  # WRITE, REV
+            if B in overwritten:
+                stats["writes"] += 1
+                continue
+            overwritten.add(B)
+            acc_live = True
+        result.append((opcode, B))
+    result.reverse()
+    return result, stats
+
+
+def fuse(program):
+    # Объединение частых пар команд в одну суперкоманду
+    result = []
+    fused = 0
+    index = 0
+    while index < len(program):
+        opcode, B = program[index]
+        if index + 1 < len(program):
+            next_opcode, next_B = program[index + 1]
+            superinstruction = FUSIONS.get((opcode, next_opcode))
+            if superinstruction is not None:
+                result.append((superinstruction, (B << 24) | next_B))
+                fused += 1
+                index += 2
+                continue
+        result.append((opcode, B))
+        index += 1
+    return result, fused
+
+
+def optimize(opcodes, operands, memory_size):
+    # Возвращает новые массивы (опкоды, операнды) и отчет об оптимизации
+    program = list(zip(opcodes, operands))
+    redundant_loads = 0
+    dead = {"loads": 0, "reads": 0, "writes": 0}
+    # Удаление мертвых команд открывает новые повторные LOAD, поэтому проходы повторяются до неподвижной точки
+    while True:
+        length = len(program)
+        program, removed = propagate_constants(program, memory_size)
+        redundant_loads += removed
+        program, stats = eliminate_dead_code(program)
+        for key, value in stats.items():
+            dead[key] += value
+        if len(program) == length:
+            break
+    program, fused = fuse(program)
+
+    new_opcodes = array("B", (opcode for opcode, _ in program))
+    new_operands = array("Q", (B for _, B in program))
+    report = {
+        "original": len(opcodes),
+        "optimized": len(new_opcodes),
+        "eliminated_loads": redundant_loads + dead["loads"],
+        "eliminated_reads": dead["reads"],
+        "eliminated_writes": dead["writes"],
+        "fused": fused,
+    }
+    report["eliminated"] = report["eliminated_loads"] + report["eliminated_reads"] + report["eliminated_writes"]
+    return new_opcodes, new_operands, report
@@ -0,0 +1,166 @@
+import argparse
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import yaml
+
+from interpreter import MEMORY_SIZE, RESULT_FORMATS, Interpreter
+
+# Предел времени задания ставится таймером SIGALRM внутри процесса пула; без setitimer (Windows) его нет
+TIMEOUT_SUPPORTED = hasattr(signal, "setitimer")
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def on_timeout(signum, frame):
+    raise JobTimeout()
+
+
+def run_job(job, timeout=None):
+    # Выполняется в процессе пула: один бинарный файл, результат пишется в job["result"]
+    started = time.perf_counter()
+    status = {"input": job["input"], "result": job["result"], "status": "ok", "instructions": 0, "error": None}
+    use_alarm = bool(timeout)
+    if use_alarm:
+        signal.signal(signal.SIGALRM, on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    interpreter = None
+    try:
+        interpreter = Interpreter(job["input"], job["result"], job["range"],
+                                  memory_size=job.get("memory_size", MEMORY_SIZE),
+                                  result_format=job.get("format", "yaml"))
+        interpreter.load_program()
+        interpreter.execute()
+        status["instructions"] = len(interpreter.opcodes)
+    except JobTimeout:
+        status["status"] = "timeout"
+        status["error"] = f"Превышено время выполнения {timeout} с"
+    except Exception as e:
+        status["status"] = "error"
+        status["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if interpreter is not None:
+            interpreter.memory.close()
+    status["seconds"] = time.perf_counter() - started
+    return status
+
+
+def jobs_from_manifest(path):
+    # Манифест - YAML-список заданий: input, result, range и необязательные format, memory_size.
+    # Относительные пути отсчитываются от каталога манифеста.
+    with open(path) as file:
+        entries = yaml.safe_load(file) or []
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for entry in entries:
+        for key in ("input", "result", "range"):
+            if key not in entry:
+                raise ValueError(f"В задании {entry} нет поля {key}")
+        job = dict(entry)
+        job["input"] = os.path.join(base, entry["input"])
+        job["result"] = os.path.join(base, entry["result"])
+        job["range"] = tuple(entry["range"])
+        jobs.append(job)
+    return jobs
+
+
+def jobs_from_directory(path, memory_range, output_dir=None, result_format="yaml", memory_size=MEMORY_SIZE):
+    # Все *.bin каталога с общим диапазоном; результат - <имя>.<формат>
+    output_dir = output_dir or path
+    jobs = []
+    for name in sorted(os.listdir(path)):
+        if not name.endswith(".bin"):
+            continue
+        stem = os.path.splitext(name)[0]
+        jobs.append({
+            "input": os.path.join(path, name),
+            "result": os.path.join(output_dir, f"{stem}.{result_format}"),
+            "range": tuple(memory_range),
+            "format": result_format,
+            "memory_size": memory_size,
+        })
+    return jobs
+
+
+def run_jobs(jobs, workers=None, timeout=None, max_pending=None, on_done=None):
+    # Очередь ограничена: в пуле одновременно не больше max_pending заданий
+    if timeout and not TIMEOUT_SUPPORTED:
+        raise ValueError("Предел времени задания не поддерживается на этой платформе (нет signal.setitimer)")
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    started = time.perf_counter()
+    statuses = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for job in jobs:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    statuses.append(future.result())
+                    if on_done:
+                        on_done(statuses[-1])
+            pending.add(pool.submit(run_job, job, timeout))
+        for future in pending:
+            statuses.append(future.result())
+            if on_done:
+                on_done(statuses[-1])
+    return summarize(statuses, time.perf_counter() - started)
+
+
+def summarize(statuses, wall_seconds):
+    counts = {"ok": 0, "error": 0, "timeout": 0}
+    for status in statuses:
+        counts[status["status"]] += 1
+    instructions = sum(status["instructions"] for status in statuses)
+    return {
+        "jobs": len(statuses),
+        "ok": counts["ok"],
+        "failed": counts["error"],
+        "timed_out": counts["timeout"],
+        "instructions": instructions,
+        "wall_seconds": wall_seconds,
+        "instructions_per_second": instructions / wall_seconds if wall_seconds else None,
+        "results": sorted(statuses, key=lambda status: status["input"]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Параллельное выполнение многих бинарных файлов УВМ.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-m", "--manifest", help="YAML-манифест заданий (input, result, range)")
+    source.add_argument("-d", "--directory", help="Каталог с файлами .bin")
+    parser.add_argument("--range", type=int, nargs=2, help="Диапазон памяти для режима каталога (start end)")
+    parser.add_argument("--output-dir", help="Каталог результатов для режима каталога")
+    parser.add_argument("--format", choices=RESULT_FORMATS, default="yaml", help="Формат результата для режима каталога")
+    parser.add_argument("--memory-size", type=int, default=MEMORY_SIZE, help="Размер памяти в словах")
+    parser.add_argument("-j", "--workers", type=int, help="Количество процессов (по умолчанию - все ядра)")
+    parser.add_argument("--max-pending", type=int, help="Предел заданий в очереди пула")
+    parser.add_argument("--timeout", type=float, help="Предел времени одного задания в секундах")
+    parser.add_argument("-s", "--summary", help="Путь к YAML-файлу со сводкой")
+
+    args = parser.parse_args()
+    if args.manifest:
+        jobs = jobs_from_manifest(args.manifest)
+    else:
+        if args.range is None:
+            parser.error("для режима каталога нужен --range")
+        jobs = jobs_from_directory(args.directory, args.range, args.output_dir, args.format, args.memory_size)
+    if args.timeout and not TIMEOUT_SUPPORTED:
+        parser.error("--timeout не поддерживается на этой платформе")
+
+    def report(status):
+        if status["status"] != "ok":
+            print(f"{status['input']}: {status['status']} - {status['error']}")
+
+    summary = run_jobs(jobs, args.workers, args.timeout, args.max_pending, report)
+    print(f"Заданий: {summary['jobs']}, успешно: {summary['ok']}, с ошибкой: {summary['failed']}, "
+          f"по таймауту: {summary['timed_out']}, время: {summary['wall_seconds']:.2f} с")
+    if args.summary:
+        with open(args.summary, "w") as file:
+            yaml.dump(summary, file, allow_unicode=True)
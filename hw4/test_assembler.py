@@ -1,8 +1,24 @@
 import unittest
 from assembler import Assembler
 from interpreter import Interpreter
+from tracer import Tracer
+from memory import Memory
+from writers import write_yaml, write_npy
+from benchmark import generate_program
+import runner
+from runner import jobs_from_manifest, run_jobs
+from asm_cache import AssemblyCache
+from array import array
+import csv
 import os
+import yaml
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 import tempfile
+from unittest import mock
 
 class TestAssembler(unittest.TestCase):
     def setUp(self):
@@ -12,10 +28,15 @@ class TestAssembler(unittest.TestCase):
         self.output_file = os.path.join(self.temp_dir, "test.bin")
         self.log_file = os.path.join(self.temp_dir, "test.yaml")
         self.result_file = os.path.join(self.temp_dir, "temp_result.yaml")
+        self.trace_file = os.path.join(self.temp_dir, "trace.csv")
+        self.memory_file = os.path.join(self.temp_dir, "memory.bin")
+        self.manifest_file = os.path.join(self.temp_dir, "manifest.yaml")
 
     def tearDown(self):
         # Удаляем временные файлы
-        for file in [self.input_file, self.output_file, self.log_file]:
+        for file in [self.input_file, self.output_file, self.log_file, self.result_file,
+                     self.trace_file, self.memory_file,
+                     self.manifest_file]:
             if os.path.exists(file):
                 os.remove(file)
         os.rmdir(self.temp_dir)
@@ -116,6 +137,240 @@ class TestAssembler(unittest.TestCase):
         with self.assertRaises(ValueError):
             assembler.assemble()
 
+    def test_missing_input(self):
+        # Отсутствующий исходник дает FileNotFoundError для него, прежний байт-код сохраняется
+        with open(self.output_file, 'wb') as f:
+            f.write(b"old")
+        assembler = Assembler(self.input_file, self.output_file, self.log_file)
+        with self.assertRaises(FileNotFoundError) as error:
+            assembler.assemble()
+        self.assertEqual(error.exception.filename, self.input_file)
+        with open(self.output_file, 'rb') as f:
+            self.assertEqual(f.read(), b"old")
+
+        # Ошибка в строке программы тоже не портит прежний байт-код
+        with open(self.input_file, 'w') as f:
+            f.write("LOAD 6 5\nLOAD 6 99999999\n")
+        with self.assertRaisesRegex(ValueError, "Константа B должна быть в диапазоне"):
+            assembler.assemble()
+        with open(self.output_file, 'rb') as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ["program.asm", "test.bin"])
+
+    def test_predecoded_matches_reference(self):
+        # Предварительно декодированный и эталонный режимы дают одинаковую память
+        with open("program.asm") as src, open(self.input_file, 'w') as f:
+            f.write(src.read())
+            f.write("\nLOAD 6 300000\nWRITE 0 1500\nLOAD 6 1000\nREAD 3 500\nREV 0 1501\n")
+
+        assembler = Assembler(self.input_file, self.output_file, self.log_file)
+        assembler.assemble()
+
+        results = []
+        for mode in ("predecoded", "reference"):
+            interpreter = Interpreter(self.output_file, self.result_file, (100, 105), mode)
+            interpreter.load_program()
+            interpreter.execute()
+            results.append(interpreter.memory.cells.tolist())
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0][100:106], [195, 195, 254, 223, 240, 127])
+        self.assertEqual(results[0][1500], 300000)
+        self.assertEqual(results[0][1501], 300000 ^ 255)
+
+    def test_sampled_trace(self):
+        # Трассировка в режиме sample пишет каждую N-ю команду
+        with open(self.input_file, 'w') as f:
+            f.write("LOAD 6 60\nWRITE 0 100\nLOAD 6 0\nREAD 3 100\nREV 0 101\n")
+
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+
+        with Tracer("sample", self.trace_file, batch_size=1, sample_every=2) as tracer:
+            interpreter = Interpreter(self.output_file, self.result_file, (100, 101), tracer=tracer)
+            interpreter.load_program()
+            interpreter.execute()
+
+        with open(self.trace_file, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["pc", "opcode", "operand", "acc_before", "acc_after", "address"])
+        self.assertEqual(rows[1:], [
+            ["0", "LOAD", "60", "0", "60", ""],
+            ["2", "LOAD", "0", "60", "0", ""],
+            ["4", "REV", "101", "60", "60", "101"],
+        ])
+
+    def test_mmap_memory_raw_dump(self):
+        # Память в mmap-файле с 2-байтовым словом и адресом за пределами 2048 ячеек
+        with open(self.input_file, 'w') as f:
+            f.write("LOAD 6 70000\nWRITE 0 5000000\nREV 0 5000001\n")
+
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+
+        interpreter = Interpreter(self.output_file, self.result_file, (5000000, 5000001),
+                                  memory_size=1 << 24, word_size=2, memory_file=self.memory_file,
+                                  result_format="bin")
+        interpreter.load_program()
+        interpreter.execute()
+        interpreter.memory.close()
+
+        dump = array("H")
+        with open(self.result_file, "rb") as f:
+            dump.frombytes(f.read())
+        self.assertEqual(dump.tolist(), [70000 & 0xFFFF, (70000 ^ 255) & 0xFFFF])
+
+    def test_result_writers(self):
+        # Потоковый YAML совпадает с yaml.dump, .npy содержит заголовок и сырые данные
+        memory = Memory(20000, word_size=4)
+        for addr in range(0, 20000, 7):
+            memory[addr] = addr * 3
+
+        write_yaml(memory, self.result_file, 10, 19999)
+        with open(self.result_file) as f:
+            streamed = f.read()
+        self.assertEqual(streamed, yaml.dump({addr: memory[addr] for addr in range(10, 20000)}))
+
+        write_npy(memory, self.memory_file, 14, 21)
+        with open(self.memory_file, "rb") as f:
+            data = f.read()
+        header_len = int.from_bytes(data[8:10], "little")
+        self.assertEqual(data[:6], b"\x93NUMPY")
+        self.assertEqual((10 + header_len) % 64, 0)
+        self.assertIn(b"'shape': (8,)", data[10:10 + header_len])
+        self.assertEqual(data[10 + header_len:], memory.cells[14:22].tobytes())
+
+    def test_streaming_chunks(self):
+        # Сброс байт-кода мелкими кусками дает тот же результат, лог остается валидным YAML
+        with open("program.asm") as src, open(self.input_file, 'w') as f:
+            f.write(src.read())
+
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+        with open(self.output_file, 'rb') as f:
+            expected = f.read()
+
+        Assembler(self.input_file, self.output_file, self.log_file, chunk_size=5).assemble()
+        with open(self.output_file, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        with open(self.log_file) as f:
+            log = yaml.safe_load(f)
+        self.assertEqual(list(log), ["LOAD", "READ", "REV", "WRITE"])
+        self.assertEqual(log["WRITE"][0], "WRITE [0, 100]")
+        self.assertEqual(len(log["LOAD"]), 12)
+
+    def test_generate_program(self):
+        # Сгенерированная программа нужной длины собирается и выполняется без ошибок
+        count = generate_program(self.input_file, 500, {"READ": 1, "REV": 1}, memory_size=64, seed=1)
+        self.assertEqual(count, 500)
+
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+        interpreter = Interpreter(self.output_file, self.result_file, (0, 63), memory_size=64)
+        interpreter.load_program()
+        interpreter.run()
+        self.assertEqual(len(interpreter.opcodes), 500)
+
+        # Нечетная длина программы только из READ: последняя позиция заполняется LOAD
+        self.assertEqual(generate_program(self.input_file, 7, {"READ": 1}, memory_size=64), 7)
+        with open(self.input_file) as f:
+            self.assertEqual(f.read().splitlines()[-1], "LOAD 6 0")
+
+    @unittest.skipIf(numpy is None, "numpy не установлен")
+    def test_batch_matches_sequential(self):
+        # Пакетное выполнение совпадает с последовательными запусками Interpreter
+        from batch import BatchInterpreter
+
+        with open(self.input_file, 'w') as f:
+            f.write("LOAD 6 0\nREAD 3 10\nREAD 3 0\nWRITE 0 20\nREV 0 21\n"
+                    "LOAD 6 5\nREAD 3 10\nWRITE 0 22\nLOAD 6 7\nREV 0 23\n")
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+
+        rng = numpy.random.default_rng(0)
+        images = rng.integers(0, 32, size=(50, 32), dtype=numpy.uint32)
+
+        batch = BatchInterpreter(self.output_file, images)
+        batch.load_program()
+        batch.run()
+
+        for index, image in enumerate(images):
+            interpreter = Interpreter(self.output_file, self.result_file, (0, 31), memory_size=32)
+            interpreter.cells[:] = array("I", image.tolist())
+            interpreter.load_program()
+            interpreter.run()
+            self.assertEqual(batch.results(0, 31)[index].tolist(), interpreter.cells.tolist())
+            self.assertEqual(int(batch.acc[index]), interpreter.acc)
+
+    def test_runner_manifest(self):
+        # Параллельный прогон по манифесту: успешное задание, ошибка и таймаут
+        with open("program.asm") as src, open(self.input_file, 'w') as f:
+            f.write(src.read())
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+        generate_program(self.log_file, 100000, seed=2)
+        Assembler(self.log_file, self.memory_file, self.trace_file).assemble()
+        with open(self.manifest_file, 'w') as f:
+            yaml.dump([
+                {"input": "test.bin", "result": "temp_result.yaml", "range": [100, 105]},
+                {"input": "test.bin", "result": "trace.csv", "range": [100, 5000]},
+                {"input": "memory.bin", "result": "program.asm", "range": [0, 1]},
+            ], f)
+
+        # Без setitimer предел времени не отбрасывается молча, а отклоняется
+        with mock.patch.object(runner, "TIMEOUT_SUPPORTED", False):
+            with self.assertRaises(ValueError):
+                run_jobs(jobs_from_manifest(self.manifest_file), workers=1, timeout=1)
+        if not runner.TIMEOUT_SUPPORTED:
+            self.skipTest("нет signal.setitimer")
+
+        summary = run_jobs(jobs_from_manifest(self.manifest_file), workers=2, timeout=0.02, max_pending=1)
+        statuses = [job["status"] for job in summary["results"]]
+        self.assertEqual(sorted(statuses), ["error", "ok", "timeout"])
+        self.assertEqual((summary["ok"], summary["failed"], summary["timed_out"]), (1, 1, 1))
+        with open(self.result_file) as f:
+            self.assertEqual(yaml.safe_load(f)[105], 127)
+
+    def test_assembly_cache(self):
+        # Повторная сборка берет строки из кэша, измененная строка кодируется заново
+        with open("program.asm") as src:
+            program = src.read()
+        with open(self.input_file, 'w') as f:
+            f.write(program)
+        cache = AssemblyCache(self.memory_file)
+        Assembler(self.input_file, self.output_file, self.log_file, cache=cache).assemble()
+        self.assertEqual(cache.report()["misses"], 24)
+
+        with open(self.input_file, 'w') as f:
+            f.write(program.replace("WRITE 0 105", "WRITE 0 106  # изменено"))
+        cache = AssemblyCache(self.memory_file)
+        Assembler(self.input_file, self.output_file, self.log_file, cache=cache).assemble()
+        self.assertEqual((cache.report()["hits"], cache.report()["misses"]), (29, 1))
+        with open(self.output_file, 'rb') as f:
+            cached = f.read()
+        with open(self.log_file) as f:
+            cached_log = f.read()
+
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+        with open(self.output_file, 'rb') as f:
+            self.assertEqual(cached, f.read())
+        with open(self.log_file) as f:
+            self.assertEqual(cached_log, f.read())
+
+    def test_optimizer(self):
+        # Оптимизированная программа дает ту же память, мертвые команды удаляются
+        with open(self.input_file, 'w') as f:
+            f.write("LOAD 6 5\nLOAD 6 7\nWRITE 0 10\nLOAD 6 0\nLOAD 6 0\nWRITE 0 11\n"
+                    "LOAD 6 9\nWRITE 0 10\nLOAD 6 0\nREAD 3 10\nREV 0 12\nLOAD 6 1\n")
+        Assembler(self.input_file, self.output_file, self.log_file).assemble()
+
+        results = []
+        for optimize in (False, True):
+            interpreter = Interpreter(self.output_file, self.result_file, (10, 12), optimize=optimize)
+            interpreter.load_program()
+            interpreter.execute()
+            results.append(interpreter.cells[:16].tolist())
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][10:13], [9, 0, 9 ^ 255])
+
+        report = interpreter.optimization
+        self.assertEqual((report["original"], report["optimized"]), (12, 3))
+        self.assertEqual((report["eliminated_loads"], report["eliminated_writes"]), (6, 1))
+        self.assertEqual(report["fused"], 2)
+
     def main_test(self):
         assembler = Assembler(self.input_file, self.output_file, self.log_file)
         assembler.assemble()
@@ -0,0 +1,80 @@
+import csv
+
+
+TRACE_MODES = ("silent", "buffered", "sample")
+
+
+class Tracer:
+    # Трассировка выполнения: silent - ничего не пишет, buffered - пишет каждую запись,
+    # sample - только каждую N-ю. Записи копятся в буфере и сбрасываются в CSV пачками.
+    def __init__(self, mode="silent", trace_file=None, batch_size=4096, sample_every=1):
+        if mode not in TRACE_MODES:
+            raise ValueError(f"Неизвестный режим трассировки: {mode}")
+        if mode != "silent" and not trace_file:
+            raise ValueError(f"Режим трассировки {mode} требует файл трассировки")
+        if batch_size < 1:
+            raise ValueError("Размер пачки должен быть положительным")
+        if sample_every < 1:
+            raise ValueError("Шаг выборки должен быть положительным")
+        self.mode = mode
+        self.trace_file = trace_file
+        self.batch_size = batch_size
+        self.sample_every = sample_every if mode == "sample" else 1
+        self.enabled = mode != "silent"
+        self.fields = None
+        self.records = []
+        self.seen = 0
+        self.file = None
+        self.writer = None
+
+    def start(self, fields):
+        # Задает заголовок записей; сбрасывает счетчик выборки
+        self.fields = tuple(fields)
+        self.seen = 0
+
+    def record(self, *values):
+        seen = self.seen
+        self.seen = seen + 1
+        if seen % self.sample_every:
+            return
+        self.records.append(values)
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.enabled or not self.records:
+            return
+        if self.file is None:
+            self.file = open(self.trace_file, "w", newline="")
+            self.writer = csv.writer(self.file)
+            if self.fields:
+                self.writer.writerow(self.fields)
+        self.writer.writerows(self.records)
+        self.records.clear()
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def add_trace_arguments(parser):
+    parser.add_argument("--trace", choices=TRACE_MODES, default="silent",
+                        help="Режим трассировки: silent, buffered или sample")
+    parser.add_argument("--trace-file", help="Путь к CSV-файлу трассировки")
+    parser.add_argument("--trace-batch", type=int, default=4096,
+                        help="Количество записей, сбрасываемых в файл за раз")
+    parser.add_argument("--sample-every", type=int, default=100,
+                        help="В режиме sample записывается каждая N-я команда")
+
+
+def tracer_from_args(args):
+    return Tracer(args.trace, args.trace_file, args.trace_batch, args.sample_every)
@@ -0,0 +1,57 @@
+import sys
+
+
+CHUNK_SIZE = 8192  # Количество ячеек, записываемых за один вызов write
+
+
+def iter_chunks(memory, start, end):
+    # Обход диапазона памяти кусками без построения промежуточного словаря
+    with memory.view(start, end) as view:
+        for offset in range(0, len(view), CHUNK_SIZE):
+            yield start + offset, view[offset:offset + CHUNK_SIZE].tolist()
+
+
+def write_yaml(memory, path, start, end):
+    # Потоковая запись в том же виде, что и yaml.dump({адрес: значение})
+    with open(path, "w", newline="") as file:
+        for base, values in iter_chunks(memory, start, end):
+            file.write("".join(f"{addr}: {value}\n" for addr, value in enumerate(values, base)))
+
+
+def write_csv(memory, path, start, end):
+    with open(path, "w", newline="") as file:
+        file.write("address,value\n")
+        for base, values in iter_chunks(memory, start, end):
+            file.write("".join(f"{addr},{value}\n" for addr, value in enumerate(values, base)))
+
+
+def write_bin(memory, path, start, end):
+    # Сырые слова памяти в порядке байтов платформы
+    with open(path, "wb") as file:
+        memory.dump(file, start, end)
+
+
+def npy_header(word_size, count):
+    # Заголовок формата .npy версии 1.0 для одномерного массива беззнаковых слов
+    byteorder = "|" if word_size == 1 else ("<" if sys.byteorder == "little" else ">")
+    header = f"{{'descr': '{byteorder}u{word_size}', 'fortran_order': False, 'shape': ({count},), }}"
+    # Магия (6) + версия (2) + длина заголовка (2) + заголовок с '\n' выравниваются на 64 байта
+    padding = -(10 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header
+
+
+def write_npy(memory, path, start, end):
+    # Файл читается numpy.load без зависимости от numpy при записи
+    memory.check_range(start, end)
+    with open(path, "wb") as file:
+        file.write(npy_header(memory.word_size, end - start + 1))
+        memory.dump(file, start, end)
+
+
+RESULT_WRITERS = {
+    "yaml": write_yaml,
+    "csv": write_csv,
+    "bin": write_bin,
+    "npy": write_npy,
+}